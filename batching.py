@@ -0,0 +1,82 @@
+# batching.py
+# Tamaño de lote adaptativo para sendlog. Con un lote fijo (el de
+# VALID_SENDLOG o FLUSH_BATCH_SIZE) no se sabe si el servidor aguantaría
+# lotes mayores; aquí cada terminal ajusta el suyo con un control AIMD
+# (como la ventana de TCP) a partir del RTT del ret sendlog y de los fallos,
+# enviando un lote cada vez (espera el ret antes del siguiente). El tamaño al
+# que converge la flota es el candidato a configurar en el firmware.
+from config import (ADAPTIVE_MIN_BATCH, ADAPTIVE_MAX_BATCH, ADAPTIVE_STEP, ADAPTIVE_BACKOFF,
+                    ADAPTIVE_TARGET_RTT, FLUSH_BATCH_SIZE)
+
+AVERAGE_WEIGHT = 0.1    # Peso de cada ret en la media móvil del tamaño (sierra del AIMD)
+
+
+class AimdBatch:
+    """
+    Cada ret a tiempo (RTT <= target_rtt y result:true) suma `step` registros al
+    lote; un ret lento, un result:false, un timeout o una conexión perdida lo
+    multiplican por `backoff`.
+    """
+
+    __slots__ = ("size", "min_size", "max_size", "step", "backoff", "target_rtt",
+                 "average", "acked", "records", "busy", "decreases")
+
+    def __init__(self, size: int = FLUSH_BATCH_SIZE, min_size: int = ADAPTIVE_MIN_BATCH,
+                 max_size: int = ADAPTIVE_MAX_BATCH, step: int = ADAPTIVE_STEP,
+                 backoff: float = ADAPTIVE_BACKOFF, target_rtt: float = ADAPTIVE_TARGET_RTT):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.size = max(min_size, min(max_size, size))
+        self.step = step
+        self.backoff = backoff
+        self.target_rtt = target_rtt
+        self.average = float(self.size)     # media móvil del tamaño: el valor de convergencia
+        self.acked = 0                      # ret recibidos
+        self.records = 0                    # registros confirmados con result:true
+        self.busy = 0.0                     # suma de RTT: tiempo esperando ret
+        self.decreases = 0
+
+    def on_ack(self, rtt: float, ok: bool, records: int, penalised: bool = False):
+        """`penalised`: el lote ya se castigó (timeout, reconexión) y no reduce otra vez."""
+        self.acked += 1
+        self.busy += rtt
+        if ok:
+            self.records += records
+        if ok and rtt <= self.target_rtt:
+            self.size = min(self.max_size, self.size + self.step)
+        elif not penalised:
+            self.decrease()
+        self.average += AVERAGE_WEIGHT * (self.size - self.average)
+
+    def decrease(self):
+        self.size = max(self.min_size, int(self.size * self.backoff))
+        self.decreases += 1
+
+    def throughput(self) -> float:
+        """Registros confirmados por segundo de espera de ret."""
+        return self.records / self.busy if self.busy else 0.0
+
+
+def _median(values: list) -> float:
+    values = sorted(values)
+    return values[len(values) // 2] if values else 0.0
+
+
+def summarize(batchers: list) -> dict:
+    """Tamaño de convergencia y rendimiento de la flota (terminales con algún ret)."""
+    active = [b for b in batchers if b.acked]
+    return {
+        "devices": len(active),
+        "batch_median": _median([b.average for b in active]),
+        "batch_mean": sum(b.average for b in active) / len(active) if active else 0.0,
+        "throughput_median": _median([b.throughput() for b in active]),
+        "decreases": sum(b.decreases for b in active),
+    }
+
+
+def print_summary(summary: dict):
+    if not summary["devices"]:
+        return
+    print(f"   ➤ Lote sendlog adaptativo:  mediana {summary['batch_median']:.0f} registros "
+          f"(media {summary['batch_mean']:.0f}, {summary['decreases']} reducciones)")
+    print(f"   ➤ Rendimiento por terminal: mediana {summary['throughput_median']:.1f} registros/s")
@@ -0,0 +1,89 @@
+import json
+import timeit
+
+import codec
+from message_templates import (REGISTER_TEMPLATE, ack_frame, get_valid_register,
+                               register_frame)
+from store import DeviceStore, synthetic_record
+
+# -------------------------------------------------
+# Microbenchmark del coste de codificar cada mensaje:
+# construcción + json.dumps (como los ws_*.py) frente a plantillas
+# pre-serializadas en las que solo se insertan los campos variables,
+# comparación de los codecs JSON disponibles (codec.py) y coste de
+# codec.peek frente a decodificar el mensaje entero.
+# -------------------------------------------------
+
+ITERATIONS = 20000
+SN = "ZX0006827500"
+
+
+def bench(label: str, fn, baseline: float = None) -> float:
+    seconds = min(timeit.repeat(fn, number=ITERATIONS, repeat=5)) / ITERATIONS
+    extra = f"  (x{baseline / seconds:.1f})" if baseline else ""
+    print(f"   ➤ {label:<42} {seconds * 1e6:8.2f} µs/frame{extra}")
+    return seconds
+
+
+def run():
+    store = DeviceStore()
+    store.seed_users(1000)
+    counts = store.counts()
+    bound = REGISTER_TEMPLATE.bind(sn=SN)
+
+    print("\n📊 Registro (reg)")
+    before = bench("get_valid_register + json.dumps",
+                   lambda: json.dumps(get_valid_register(SN, **counts)))
+    bench("REGISTER_TEMPLATE.render (sn por frame)",
+          lambda: register_frame(REGISTER_TEMPLATE, dict(counts, sn=SN)), before)
+    bench("plantilla con sn fijado (bind)", lambda: register_frame(bound, counts), before)
+
+    print("\n📊 Confirmación fija (ret deleteuser)")
+    before = bench("json.dumps({'ret': ..., 'result': True})",
+                   lambda: json.dumps({"ret": "deleteuser", "result": True}))
+    bench("ack_frame('deleteuser')", lambda: ack_frame("deleteuser"), before)
+
+    bench_codecs(counts)
+
+
+def sample_messages(counts: dict) -> dict:
+    """Mensajes representativos del protocolo para comparar codecs."""
+    return {
+        "reg": get_valid_register(SN, **counts),
+        "getuserlist (40)": {
+            "ret": "getuserlist", "result": True, "count": 40, "from": 0, "to": 39,
+            "record": [{"enrollid": i, "admin": 0, "backupnum": i % 12} for i in range(1, 41)],
+        },
+        "sendlog (batch 20)": {
+            "cmd": "sendlog", "count": 20,
+            "record": [{"enrollid": i, "time": "2025-10-16 09:00:00", "mode": 0,
+                        "inout": i % 2, "event": 0} for i in range(1, 21)],
+        },
+        "senduser (huella 1620)": {
+            "cmd": "senduser", "enrollid": 1, "name": "chingzou", "backupnum": 0,
+            "admin": 0, "record": synthetic_record(1, 0),
+        },
+    }
+
+
+def bench_codecs(counts: dict):
+    messages = sample_messages(counts)
+    for name in codec.available_codecs():
+        c = codec.get_codec(name)
+        print(f"\n📊 Codec {name}")
+        for label, payload in messages.items():
+            frame = c.dumps(payload)
+            encode = min(timeit.repeat(lambda: c.dumps(payload), number=ITERATIONS, repeat=5))
+            decode = min(timeit.repeat(lambda: c.loads(frame), number=ITERATIONS, repeat=5))
+            print(f"   ➤ {label:<24} dumps {encode / ITERATIONS * 1e6:7.2f} µs   "
+                  f"loads {decode / ITERATIONS * 1e6:7.2f} µs   ({len(frame)} B)")
+
+    print("\n📊 codec.peek (solo cmd/ret) frente a codec.loads")
+    for label, payload in messages.items():
+        frame = codec.dumps(payload)
+        before = bench(f"loads {label}", lambda: codec.loads(frame))
+        bench(f"peek {label}", lambda: codec.peek(frame), before)
+
+
+if __name__ == "__main__":
+    run()
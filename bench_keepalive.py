@@ -0,0 +1,126 @@
+import argparse
+import asyncio
+import random
+import time
+import tracemalloc
+
+from timerwheel import TimerWheel
+
+# -------------------------------------------------
+# Coste del keepalive con N conexiones abiertas, sin red: cada conexión
+# tiene su tarea lectora (una cola hace de socket) y recibe frames a una
+# tasa dada. Se compara la rueda compartida (timerwheel.py, como
+# device.py con KEEPALIVE = "wheel") con un temporizador por conexión
+# (wait_for por recv + ping al vencer, como ws_reg_test.py y
+# KEEPALIVE = "task"). Los intervalos van escalados (PING_INTERVAL = 30 s
+# con ticks de 1 s → aquí `interval` y `interval / 30`) para medir muchas
+# vueltas en pocos segundos; se mide CPU del proceso y memoria asignada.
+# -------------------------------------------------
+
+CONNECTIONS = 10000
+INTERVAL = 3.0          # "PING_INTERVAL" escalado
+DURATION = 10.0
+FRAME_RATE = 2000       # frames/s repartidos entre todas las conexiones
+
+
+class Connection:
+    __slots__ = ("inbox", "pings", "frames", "timer")
+
+    def __init__(self):
+        self.inbox = asyncio.Queue()
+        self.pings = 0
+        self.frames = 0
+        self.timer = None
+
+
+async def reader_task(conn: Connection, interval: float):
+    """Temporizador por conexión: cada recv lleva su wait_for (alta y baja en el heap)."""
+    while True:
+        try:
+            await asyncio.wait_for(conn.inbox.get(), timeout=interval)
+            conn.frames += 1
+        except asyncio.TimeoutError:
+            conn.pings += 1
+
+
+async def reader_plain(conn: Connection):
+    while True:
+        await conn.inbox.get()
+        conn.frames += 1
+
+
+def heartbeat(wheel: TimerWheel, conn: Connection, interval: float):
+    conn.pings += 1
+    conn.timer = wheel.schedule(interval, heartbeat, wheel, conn, interval)
+
+
+async def traffic(conns: list, rate: float, seed: int = 0):
+    """Reparte `rate` frames/s al azar entre las conexiones, en rachas de 10 ms."""
+    rng = random.Random(seed)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    sent = 0
+    while True:
+        await asyncio.sleep(0.01)
+        due = int((loop.time() - started) * rate)
+        for _ in range(due - sent):
+            rng.choice(conns).inbox.put_nowait(b"{}")
+        sent = due
+
+
+async def measure(mode: str, connections: int, interval: float, duration: float,
+                  rate: float) -> dict:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    conns = [Connection() for _ in range(connections)]
+    wheel = TimerWheel(tick=interval / 30)
+    rng = random.Random(1)
+    if mode == "wheel":
+        tasks = [asyncio.create_task(reader_plain(c)) for c in conns]
+        # Primer ping repartido en el intervalo, como las conexiones de una rampa
+        for c in conns:
+            c.timer = wheel.schedule(rng.uniform(0, interval), heartbeat, wheel, c, interval)
+    else:
+        tasks = [asyncio.create_task(reader_task(c, interval)) for c in conns]
+    await asyncio.sleep(0)
+    memory = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    generator = asyncio.create_task(traffic(conns, rate))
+    cpu_started = time.process_time()
+    await asyncio.sleep(duration)
+    cpu = time.process_time() - cpu_started
+
+    generator.cancel()
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(generator, *tasks, return_exceptions=True)
+    return {"cpu": cpu, "memory": memory, "pings": sum(c.pings for c in conns),
+            "frames": sum(c.frames for c in conns)}
+
+
+def run(args):
+    print(f"\n📊 Keepalive de {args.connections} conexiones: ping cada {args.interval:g} s, "
+          f"{args.rate:g} frames/s, {args.duration:g} s")
+    baseline = None
+    for mode, label in (("task", "wait_for por conexión (ws_reg_test.py)"),
+                        ("wheel", "rueda compartida (timerwheel.py)")):
+        r = asyncio.run(measure(mode, args.connections, args.interval, args.duration, args.rate))
+        extra = f"  (x{baseline['cpu'] / r['cpu']:.1f} CPU)" if baseline else ""
+        print(f"   ➤ {label:<40} CPU {r['cpu'] / args.duration * 100:5.1f} %  "
+              f"memoria {r['memory'] / args.connections:6.0f} B/conexión  "
+              f"pings {r['pings']}  frames {r['frames']}{extra}")
+        baseline = baseline or r
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Coste del keepalive: rueda frente a wait_for")
+    parser.add_argument("--connections", type=int, default=CONNECTIONS)
+    parser.add_argument("--interval", type=float, default=INTERVAL)
+    parser.add_argument("--duration", type=float, default=DURATION)
+    parser.add_argument("--rate", type=float, default=FRAME_RATE)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    run(parse_args())
@@ -0,0 +1,73 @@
+import argparse
+import asyncio
+
+import codec
+from device import DeviceSession
+from latency_model import Constant
+
+# -------------------------------------------------
+# Comprueba que un comando sin carril no queda detrás de una ráfaga de su
+# carril vecino con max_inflight > 1: el servidor manda cleanuser y varios
+# deleteuser (carril "users", en orden) seguidos de getdevinfo (sin carril).
+# Los de la ráfaga esperan a su predecesor sin ocupar cupo, así que
+# getdevinfo debe responder tras su propia latencia (~1 s) y no tras la
+# de toda la ráfaga. Sin red: el socket es una lista de frames enviados.
+# -------------------------------------------------
+
+DELAY = 1.0         # latencia de cada comando del terminal
+BURST = 3           # deleteuser detrás del cleanuser
+INFLIGHT = 4
+
+
+class FakeSocket:
+    """Solo recoge lo que envía la sesión, con el instante de envío."""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, frame):
+        self.sent.append((asyncio.get_running_loop().time(), codec.loads(frame)))
+
+
+async def measure(inflight: int, burst: int, delay: float) -> dict:
+    delays = {cmd: Constant(delay) for cmd in ("cleanuser", "deleteuser", "getdevinfo")}
+    session = DeviceSession("LANES0000001", delays=delays, max_inflight=inflight, verbose=False)
+    session.ws = FakeSocket()
+    session.queue = asyncio.Queue(session.queue_size)
+    frames = [{"cmd": "cleanuser"}]
+    frames += [{"cmd": "deleteuser", "enrollid": i, "backupnum": 13} for i in range(1, burst + 1)]
+    frames.append({"cmd": "getdevinfo"})
+
+    started = asyncio.get_running_loop().time()
+    for frame in frames:
+        session.queue.put_nowait(codec.dumps(frame))
+    consumer = asyncio.create_task(session.message_consumer())
+    while len(session.ws.sent) < len(frames):
+        await asyncio.sleep(0.01)
+    consumer.cancel()
+    await asyncio.gather(consumer, return_exceptions=True)
+    return {payload["ret"]: at - started for at, payload in session.ws.sent}
+
+
+def run(args):
+    print(f"\n📊 cleanuser + {args.burst}× deleteuser + getdevinfo, "
+          f"{args.delay:g} s por comando, max_inflight={args.inflight}")
+    answered = asyncio.run(measure(args.inflight, args.burst, args.delay))
+    for ret in ("getdevinfo", "cleanuser", "deleteuser"):
+        print(f"   ➤ {ret:<12} responde a los {answered[ret]:5.2f} s")
+    ok = answered["getdevinfo"] < 2 * args.delay
+    print(f"   {'✅' if ok else '❌'} getdevinfo "
+          f"{'no espera' if ok else 'queda bloqueado'} tras la ráfaga del carril users")
+    return ok
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Comando sin carril detrás de una ráfaga de carril")
+    parser.add_argument("--inflight", type=int, default=INFLIGHT)
+    parser.add_argument("--burst", type=int, default=BURST)
+    parser.add_argument("--delay", type=float, default=DELAY)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if run(parse_args()) else 1)
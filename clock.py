@@ -0,0 +1,106 @@
+# clock.py
+# Reloj virtual de los terminales simulados: la hora que ven los handlers
+# (fichajes, "time" del registro, settime) y las esperas del modelo de
+# latencia avanzan `speedup` veces más rápido que el reloj real, así una
+# jornada de 24 h se reproduce en minutos con horas realistas.
+# Lo que depende de la red (timeouts, pings) sigue en tiempo real.
+import asyncio
+import time
+from datetime import datetime
+
+from config import CLOCK_SPEEDUP, CLOCK_START
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def parse_start(start) -> float:
+    """None = ahora; número = epoch; texto = "YYYY-MM-DD HH:MM:SS"."""
+    if start is None:
+        return time.time()
+    if isinstance(start, (int, float)):
+        return float(start)
+    return time.mktime(time.strptime(start, TIME_FORMAT))
+
+
+class VirtualClock:
+    """
+    Hora simulada = origen + tiempo transcurrido × speedup. El tiempo
+    transcurrido sale de `source` (time.monotonic, o loop.time en ws_sim.py).
+    """
+
+    __slots__ = ("speedup", "origin", "real_origin", "source")
+
+    def __init__(self, speedup: float = 1.0, start=None, source=time.monotonic):
+        self.source = source
+        self.speedup = speedup
+        self.origin = parse_start(start)
+        self.real_origin = source()
+
+    def set(self, start=None, speedup: float = None):
+        """Reinicia el reloj en `start` (y opcionalmente cambia el factor)."""
+        if speedup is not None:
+            self.speedup = speedup
+        self.origin = parse_start(start)
+        self.real_origin = self.source()
+
+    def now(self) -> float:
+        return self.origin + (self.source() - self.real_origin) * self.speedup
+
+    def datetime(self) -> datetime:
+        return datetime.fromtimestamp(self.now())
+
+    def format(self) -> str:
+        return time.strftime(TIME_FORMAT, time.localtime(self.now()))
+
+    async def sleep(self, seconds: float):
+        """Espera `seconds` de tiempo simulado."""
+        await asyncio.sleep(seconds / self.speedup)
+
+
+class DeviceClock:
+    """
+    Reloj de un terminal: el compartido más un desfase propio. settime solo
+    cambia el desfase, así no mueve la hora del resto de la flota (ni la del
+    servidor y el calendario de fichajes de ws_sim.py, que usan el compartido).
+    """
+
+    __slots__ = ("base", "offset")
+
+    def __init__(self, base: VirtualClock):
+        self.base = base
+        self.offset = 0.0
+
+    def now(self) -> float:
+        return self.base.now() + self.offset
+
+    def datetime(self) -> datetime:
+        return datetime.fromtimestamp(self.now())
+
+    def format(self) -> str:
+        return time.strftime(TIME_FORMAT, time.localtime(self.now()))
+
+    def settime(self, ts: float):
+        """Comando settime: este terminal pasa a marcar `ts`, al ritmo del compartido."""
+        self.offset = ts - self.base.now()
+
+    async def sleep(self, seconds: float):
+        await self.base.sleep(seconds)
+
+
+def loop_time() -> float:
+    """
+    Tiempo monótono del loop en curso, para medir latencias: en la simulación
+    de eventos discretos (ws_sim.py) es el tiempo virtual del loop.
+    """
+    return asyncio.get_running_loop().time()
+
+
+# Reloj compartido por todas las sesiones del proceso
+shared_clock = VirtualClock(CLOCK_SPEEDUP, CLOCK_START)
+
+
+def configure(speedup: float = None, start=None) -> VirtualClock:
+    """Cambia el reloj compartido; sin argumentos no hace nada."""
+    if speedup is not None or start is not None:
+        shared_clock.set(start, speedup)
+    return shared_clock
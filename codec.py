@@ -0,0 +1,134 @@
+# codec.py
+# Capa de codificación JSON de todos los mensajes del protocolo.
+# Usa orjson o msgspec si están instalados y, si no, el json estándar.
+# El resto del código llama a codec.loads / codec.dumps / codec.DECODE_ERRORS,
+# así que `codec.use("json")` cambia de implementación en caliente.
+import json
+import re
+import sys
+
+from config import JSON_CODEC
+
+AUTO_ORDER = ("orjson", "msgspec", "json")
+
+
+class Codec:
+    __slots__ = ("name", "loads", "dumps", "errors")
+
+    def __init__(self, name, loads, dumps, errors):
+        self.name = name
+        self.loads = loads      # str | bytes → objeto
+        self.dumps = dumps      # objeto → str (frame de texto del WebSocket)
+        self.errors = errors    # excepciones de JSON inválido
+
+
+def _stdlib_codec() -> Codec:
+    return Codec("json", json.loads, json.dumps, (ValueError,))
+
+
+def _orjson_codec() -> Codec:
+    import orjson
+
+    def dumps(obj):
+        return orjson.dumps(obj).decode()
+
+    return Codec("orjson", orjson.loads, dumps, (ValueError,))
+
+
+def _msgspec_codec() -> Codec:
+    import msgspec
+
+    encoder = msgspec.json.Encoder()
+    decoder = msgspec.json.Decoder()
+
+    def dumps(obj):
+        return encoder.encode(obj).decode()
+
+    return Codec("msgspec", decoder.decode, dumps, (msgspec.DecodeError, ValueError))
+
+
+FACTORIES = {"json": _stdlib_codec, "orjson": _orjson_codec, "msgspec": _msgspec_codec}
+
+
+def get_codec(name: str = "auto") -> Codec:
+    """
+    Devuelve el codec pedido; "auto" = el más rápido disponible. Si el pedido
+    no está instalado se avisa y se usa el json estándar (simlog importa este
+    módulo, así que el aviso va directo a stderr).
+    """
+    if name != "auto":
+        try:
+            return FACTORIES[name]()
+        except ImportError as ex:
+            print(f"⚠️ Codec {name} no disponible ({ex}), se usa json estándar", file=sys.stderr)
+            return _stdlib_codec()
+    for candidate in AUTO_ORDER:
+        try:
+            return FACTORIES[candidate]()
+        except ImportError:
+            continue
+    return _stdlib_codec()
+
+
+def available_codecs() -> list:
+    names = []
+    for name in FACTORIES:
+        try:
+            FACTORIES[name]()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def use(name: str) -> Codec:
+    """Activa un codec para todo el proceso."""
+    global active, loads, dumps, DECODE_ERRORS
+    active = get_codec(name)
+    loads = active.loads
+    dumps = active.dumps
+    DECODE_ERRORS = active.errors
+    return active
+
+
+# Valor string tras una clave "cmd"/"ret", sin decodificar el resto del mensaje.
+# Dentro de un string JSON las comillas van escapadas (\"), así que '"cmd"'
+# no puede aparecer dentro de nombres, huellas o records.
+_PEEK_VALUE = re.compile(r'\s*:\s*"([^"\\]*)"')
+
+
+def _peek_key(frame: str, key: str, start: int):
+    """(valor, posición) de la primera `key` con valor string, o (None, -1)."""
+    i = frame.find(key, start)
+    while i >= 0:
+        match = _PEEK_VALUE.match(frame, i + len(key))
+        if match:
+            return match.group(1), i
+        i = frame.find(key, i + 1)
+    return None, -1
+
+
+def peek(frame):
+    """
+    (tipo, nombre) de un mensaje crudo: ("cmd", "opendoor"), ("ret", "sendlog")
+    o (None, None) si no se encuentra. Si hay ambas claves manda "cmd".
+    Con un { o [ antes de la clave puede ser de un objeto anidado
+    ({"devinfo": {"cmd": ...}}): tampoco se adivina y el que llama decodifica
+    el mensaje completo.
+    """
+    if isinstance(frame, (bytes, bytearray)):
+        frame = frame.decode("utf-8", "replace")
+    start = frame.find("{") + 1
+    kind = "cmd"
+    name, at = _peek_key(frame, '"cmd"', start)
+    if name is None:
+        kind = "ret"
+        name, at = _peek_key(frame, '"ret"', start)
+    if name is None or at > start and (frame.find("{", start, at) >= 0
+                                       or frame.find("[", start, at) >= 0):
+        return None, None
+    return kind, name
+
+
+active = loads = dumps = DECODE_ERRORS = None
+use(JSON_CODEC)
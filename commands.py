@@ -0,0 +1,355 @@
+# commands.py
+# Motor único de comandos del terminal simulado.
+# HANDLERS asocia cada "cmd" del servidor con su handler (búsqueda O(1) en un dict);
+# RET_HANDLERS hace lo mismo con las confirmaciones "ret" que envía el servidor.
+# Un handler es `async def handler(device, data)` y responde con `reply(...)` o
+# `respond(...)`, que aplican la política de fallos del terminal (faults.py).
+import asyncio
+
+from clock import loop_time
+from config import LOG_CHUNK_SIZE
+from message_templates import ack_frame
+from simlog import DEBUG, WARNING
+from store import BACKUP_ALL, LogCursor, parse_time
+
+USERLIST_CHUNK_SIZE = 40  # usuarios por paquete en getuserlist
+SETUSERNAME_MAX = 50      # máximo de nombres por setusername
+
+HANDLERS = {}
+RET_HANDLERS = {}
+
+# Reglas de orden para la ejecución concurrente: los comandos de un mismo
+# carril se atienden en orden de llegada; los que no tienen carril van libres.
+COMMAND_LANES = {
+    "getalllog": "logs",
+    "getnewlog": "logs",
+    "cleanlog": "logs",
+    "getuserlist": "users",
+    "getuserinfo": "users",
+    "setuserinfo": "users",
+    "senduser": "users",
+    "deleteuser": "users",
+    "getusername": "users",
+    "setusername": "users",
+    "enableuser": "users",
+    "cleanuser": "users",
+    "cleanadmin": "users",
+    "initsys": "system",
+    "reboot": "system",
+    "settime": "system",
+    "opendoor": "door",
+}
+
+
+def handler(cmd: str, registry: dict = HANDLERS, body: bool = True):
+    """
+    Decorador: registra `fn` como handler del comando `cmd`.
+    Con body=False el handler recibe solo {"cmd": cmd} y el mensaje no se decodifica;
+    la marca va en la función (fn.needs_body), no en el nombre del comando.
+    """
+    def decorator(fn):
+        registry[cmd] = fn
+        fn.needs_body = body
+        return fn
+    return decorator
+
+
+def ret_handler(cmd: str):
+    """Decorador: registra `fn` como handler de la confirmación 'ret' de `cmd`."""
+    return handler(cmd, RET_HANDLERS)
+
+
+def lookup(device, kind: str, name: str):
+    """Handler de un "cmd" del servidor o de una confirmación "ret" (o None)."""
+    return (device.handlers if kind == "cmd" else RET_HANDLERS).get(name)
+
+
+async def invoke(device, name: str, fn, data: dict):
+    device.count(f"cmd_{name}")
+    if device.latency is None:
+        await fn(device, data)
+        return
+    started = loop_time()
+    await fn(device, data)
+    if "cmd" in data:
+        device.observe(f"proc:{name}", loop_time() - started)
+
+
+# ------------------- AUXILIARES -------------------
+
+def result(device, cmd: str, ok: bool = True, **extra) -> dict:
+    """Respuesta estándar {"ret": cmd, "result": ...}."""
+    if not ok:
+        return {"ret": cmd, "result": False, "reason": 1}
+    response = {"ret": cmd, "result": True}
+    response.update(extra)
+    return response
+
+
+async def send_response(device, response):
+    if isinstance(response, str):
+        await device.send_raw(response)
+    else:
+        await device.send(response)
+
+
+async def respond(device, cmd: str, response):
+    """
+    Envía la respuesta a `cmd` (dict o trama pre-serializada) pasando por la
+    política de fallos del terminal (faults.py): error, pérdida, retraso,
+    duplicado o corte de la conexión.
+    """
+    fault = device.draw_fault(cmd)
+    if fault is None:
+        await send_response(device, response)
+        return
+    action, arg = fault
+    device.count(f"fault_{action}")
+    device.log("💥 Fallo inyectado", level=DEBUG, cmd=cmd, sampled=True, fault=action)
+    if action == "error":
+        await send_response(device, ack_frame(cmd, False) if arg == 1 else
+                            {"ret": cmd, "result": False, "reason": arg})
+    elif action == "delay":
+        # Tiempo real (o del loop en ws_sim.py): lo que cuenta es el timeout del servidor
+        await asyncio.sleep(arg)
+        await send_response(device, response)
+    elif action == "duplicate":
+        await send_response(device, response)
+        await send_response(device, response)
+    elif action == "disconnect":
+        await device.ws.close()
+    # "drop": no se envía nada
+
+
+async def reply(device, cmd: str, ok: bool = True, **extra):
+    await device.hardware_delay(cmd)
+    if ok and extra:
+        await respond(device, cmd, result(device, cmd, ok, **extra))
+    else:
+        # Confirmación fija: se envía la versión pre-serializada
+        await respond(device, cmd, ack_frame(cmd, ok))
+
+
+def store_user(device, data: dict) -> bool:
+    """Guarda en el almacén el usuario de un setuserinfo / senduser."""
+    enrollid = data.get("enrollid")
+    backupnum = data.get("backupnum")
+    if enrollid is None or backupnum is None:
+        return False
+    return device.store.set_credential(enrollid, backupnum, data.get("record"),
+                                       name=data.get("name"), admin=data.get("admin"))
+
+
+async def send_log_packet(device, cmd: str, stn: bool):
+    """Paginación de logs compartida por getalllog y getnewlog (cursor por sesión)."""
+    await device.hardware_delay(cmd)
+    key = f"{cmd}_cursor"
+    cursor = device.state.get(key)
+    if stn or cursor is None:
+        if stn:
+            device.log("🔁 Reiniciando secuencia de paquetes (stn=true)", level=DEBUG, cmd=cmd)
+        # getnewlog solo recorre lo que hay después de la marca de lectura
+        start_seq = device.store.new_log_seq() if cmd == "getnewlog" else None
+        cursor = device.state[key] = LogCursor(device.store, start_seq)
+
+    start, paquete = cursor.next_packet(LOG_CHUNK_SIZE)
+    if paquete:
+        response = {
+            "ret": cmd,
+            "result": True,
+            "count": len(paquete),
+            "from": start,
+            "to": start + len(paquete) - 1,
+            "record": paquete
+        }
+        device.log("📤 Enviando paquete", level=DEBUG, cmd=cmd, sampled=True,
+                   start=start, to=response["to"], count=len(paquete))
+    else:
+        # No hay más registros: el servidor pidió el siguiente paquete, así que
+        # recibió todos los anteriores → en getnewlog se avanza la marca
+        response = {"ret": cmd, "result": True, "count": 0, "from": 0, "to": 0, "record": []}
+        del device.state[key]
+        if cmd == "getnewlog":
+            device.store.mark_new_logs_read(cursor.next_seq)
+        device.log("📭 No hay más registros, enviando respuesta final", level=DEBUG, cmd=cmd)
+    await respond(device, cmd, response)
+
+
+# ------------------- LOGS -------------------
+
+@handler("getalllog")
+async def handle_getalllog(device, data):
+    await send_log_packet(device, "getalllog", data.get("stn", False))
+
+
+@handler("getnewlog")
+async def handle_getnewlog(device, data):
+    await send_log_packet(device, "getnewlog", data.get("stn", False))
+
+
+@handler("cleanlog", body=False)
+async def handle_cleanlog(device, data):
+    device.log("🧹 Servidor solicita limpiar todos los logs", cmd="cleanlog")
+    await reply(device, "cleanlog")
+    device.store.clean_logs()
+
+
+# ------------------- USUARIOS -------------------
+
+@handler("getuserlist")
+async def handle_getuserlist(device, data):
+    await device.hardware_delay("getuserlist")
+    if data.get("stn", False) or "getuserlist" not in device.state:
+        # Foto de las credenciales al empezar el recorrido
+        device.state["getuserlist"] = device.store.user_entries()
+        device.state["getuserlist_index"] = 0
+    index = device.state["getuserlist_index"]
+    start = index * USERLIST_CHUNK_SIZE
+    paquete = [{"enrollid": e, "admin": a, "backupnum": b}
+               for e, a, b in device.state["getuserlist"][start:start + USERLIST_CHUNK_SIZE]]
+    if paquete:
+        response = {"ret": "getuserlist", "result": True, "count": len(paquete),
+                    "from": start, "to": start + len(paquete) - 1, "record": paquete}
+        device.state["getuserlist_index"] = index + 1
+    else:
+        response = {"ret": "getuserlist", "result": True, "count": 0,
+                    "from": 0, "to": 0, "record": []}
+        del device.state["getuserlist"]
+    await respond(device, "getuserlist", response)
+
+
+@handler("getuserinfo")
+async def handle_getuserinfo(device, data):
+    enrollid = data.get("enrollid")
+    backupnum = data.get("backupnum")
+    device.log("🧾 Solicitud de usuario", cmd="getuserinfo", enrollid=enrollid, backupnum=backupnum)
+    found = device.store.get_credential(enrollid, backupnum)
+    if found is None:
+        await reply(device, "getuserinfo", ok=False)
+        return
+    admin, name, record = found
+    await reply(device, "getuserinfo", enrollid=enrollid, name=name,
+                backupnum=backupnum, admin=admin, record=record)
+
+
+@handler("setuserinfo")
+async def handle_setuserinfo(device, data):
+    device.log("🧠 Registrar usuario", cmd="setuserinfo", enrollid=data.get("enrollid"),
+               name=data.get("name"), backupnum=data.get("backupnum"), admin=data.get("admin"))
+    await reply(device, "setuserinfo", ok=store_user(device, data))
+
+
+@handler("senduser")
+async def handle_senduser(device, data):
+    # El servidor empuja un usuario con el mismo formato que senduser del terminal
+    device.log("👤 Usuario recibido", cmd="senduser", enrollid=data.get("enrollid"),
+               name=data.get("name"))
+    await reply(device, "senduser", ok=store_user(device, data))
+
+
+@handler("deleteuser")
+async def handle_deleteuser(device, data):
+    device.log("🗑️ Eliminar usuario", cmd="deleteuser", enrollid=data.get("enrollid"),
+               backupnum=data.get("backupnum"))
+    ok = device.store.delete(data.get("enrollid"), data.get("backupnum", BACKUP_ALL))
+    await reply(device, "deleteuser", ok=ok)
+
+
+@handler("getusername")
+async def handle_getusername(device, data):
+    device.log("🧩 Nombre de usuario", cmd="getusername", enrollid=data.get("enrollid"))
+    name = device.store.get_name(data.get("enrollid"))
+    await reply(device, "getusername", ok=name is not None, record=name)
+
+
+@handler("setusername")
+async def handle_setusername(device, data):
+    records = data.get("record", [])
+    if data.get("count", 0) > SETUSERNAME_MAX or len(records) > SETUSERNAME_MAX:
+        device.log(f"⚠️ Más de {SETUSERNAME_MAX} registros, truncando.", level=WARNING,
+                   cmd="setusername")
+        records = records[:SETUSERNAME_MAX]
+    device.log("📝 Actualizar nombres de usuario", cmd="setusername", count=len(records))
+    for r in records:
+        device.store.set_name(r.get("enrollid"), r.get("name"))
+    await reply(device, "setusername")
+
+
+@handler("enableuser")
+async def handle_enableuser(device, data):
+    action = "HABILITAR" if data.get("enflag") == 1 else "DESHABILITAR"
+    device.log(f"🔐 {action} usuario", cmd="enableuser", enrollid=data.get("enrollid"))
+    ok = device.store.set_enabled(data.get("enrollid"), data.get("enflag") == 1)
+    await reply(device, "enableuser", ok=ok)
+
+
+@handler("cleanuser", body=False)
+async def handle_cleanuser(device, data):
+    device.log("🧹 Limpiar TODOS los usuarios del dispositivo", cmd="cleanuser")
+    await reply(device, "cleanuser")
+    device.store.clean_users()
+
+
+@handler("cleanadmin", body=False)
+async def handle_cleanadmin(device, data):
+    device.log("🧹 Limpiar administradores (pasan a usuarios normales)", cmd="cleanadmin")
+    await reply(device, "cleanadmin")
+    device.store.clean_admins()
+
+
+# ------------------- SISTEMA -------------------
+
+@handler("initsys", body=False)
+async def handle_initsys(device, data):
+    device.log("🧩 Inicializar sistema: borra usuarios y logs", cmd="initsys")
+    await reply(device, "initsys")
+    device.store.clean_users()
+    device.store.clean_logs()
+
+
+@handler("reboot", body=False)
+async def handle_reboot(device, data):
+    device.log("🔄 Cerrando conexión para simular reinicio", cmd="reboot")
+    await device.ws.close()
+
+
+@handler("settime")
+async def handle_settime(device, data):
+    device.log("⏰ Sincronizar hora", cmd="settime", cloudtime=data.get("cloudtime"))
+    try:
+        ts = parse_time(data.get("cloudtime"))
+    except (TypeError, ValueError):
+        await reply(device, "settime", ok=False)
+        return
+    await reply(device, "settime")
+    # El reloj del terminal sigue avanzando con el mismo factor desde la hora
+    # recibida; el compartido de la flota no se toca
+    device.clock.settime(ts)
+
+
+@handler("getdevinfo", body=False)
+async def handle_getdevinfo(device, data):
+    await reply(device, "getdevinfo", deviceid=1, language=0, volume=0,
+                screensaver=0, verifymode=0, sleep=0, userfpnum=3, loghint=1000,
+                reverifytime=0)
+
+
+@handler("opendoor", body=False)
+async def handle_opendoor(device, data):
+    device.log("🔓 Abrir puerta (activando relay simulado)", cmd="opendoor")
+    await reply(device, "opendoor")
+
+
+# ------------------- CONFIRMACIONES DEL SERVIDOR -------------------
+
+@ret_handler("sendlog")
+async def handle_ret_sendlog(device, data):
+    ok = bool(data.get("result"))
+    device.acknowledge("sendlog", ok)
+    device.count("sendlog_ok" if ok else "sendlog_failed")
+
+
+@ret_handler("senduser")
+async def handle_ret_senduser(device, data):
+    device.acknowledge("senduser")
+    device.count("senduser_ok" if data.get("result") else "senduser_failed")
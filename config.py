@@ -6,3 +6,104 @@ TIMEOUT_SECONDS = 5
 
 # Intervalo de ping para mantener conexión viva
 PING_INTERVAL = 30
+
+# Keepalive de las sesiones (device.py): "wheel" = rueda de temporizadores
+# compartida (timerwheel.py), "task" = wait_for por recv + ping como ws_reg_test.py,
+# "library" = el keepalive propio de websockets, "off" = sin pings. Sin frames
+# ni pong durante IDLE_TIMEOUT s la conexión se da por muerta y se cierra
+KEEPALIVE = "wheel"
+IDLE_TIMEOUT = 90
+# Rueda de temporizadores: huecos de WHEEL_TICK s, WHEEL_SLOTS huecos por vuelta
+WHEEL_TICK = 1.0
+WHEEL_SLOTS = 64
+
+# Flota de terminales simulados (ws_fleet.py)
+FLEET_SN_PREFIX = "ZX"
+FLEET_SN_START = 6827500
+FLEET_DEVICES = 100
+
+# Comandos atendidos en paralelo por dispositivo (1 = en serie) y tamaño de su cola
+DEVICE_MAX_INFLIGHT = 4
+DEVICE_QUEUE_SIZE = 64
+
+# Reconexión de los terminales si se cae la conexión: backoff exponencial con jitter
+# completo, espera = aleatorio(0, min(CAP, BASE·2^(intento-1))); MAX_ATTEMPTS 0 = sin límite
+RECONNECT = True
+RECONNECT_BASE = 0.5
+RECONNECT_CAP = 30.0
+RECONNECT_MAX_ATTEMPTS = 0
+
+# Arranque escalonado de la flota (ramp.py): perfil "burst" / "linear" / "step",
+# conexiones/s (o incremento por escalón), duración del escalón, ráfagas de
+# RAMP_BURST_SIZE sesiones cada RAMP_INTERVAL s (0 = todas a la vez) y tope de
+# handshakes (connect + registro) simultáneos, 0 = sin tope. El codo del registro
+# es la tasa a partir de la cual su mediana supera RAMP_KNEE_FACTOR veces el inicial
+RAMP_PROFILE = "burst"
+RAMP_RATE = 50.0
+RAMP_STEP_SECONDS = 10.0
+RAMP_BURST_SIZE = 0
+RAMP_INTERVAL = 1.0
+MAX_HANDSHAKES = 0
+RAMP_KNEE_FACTOR = 3.0
+
+# Fichajes guardados sin conexión (en el buffer de logs, hasta STORE_LOGSIZE): al
+# reconectar se suben por sendlog en lotes de FLUSH_BATCH_SIZE registros y a
+# FLUSH_RATE registros/s por terminal como mucho (0 = sin tope). Un lote del
+# atraso con result:false se reintenta hasta FLUSH_MAX_RETRIES veces; después
+# sus registros cuentan como perdidos
+FLUSH_BATCH_SIZE = 100
+FLUSH_RATE = 500.0
+FLUSH_MAX_RETRIES = 3
+# Lote adaptativo (batching.py): en lugar de FLUSH_BATCH_SIZE fijo, cada terminal
+# ajusta el lote con AIMD: +ADAPTIVE_STEP registros por ret en menos de
+# ADAPTIVE_TARGET_RTT s, ×ADAPTIVE_BACKOFF si llega tarde, falla o se pierde
+SENDLOG_ADAPTIVE = False
+ADAPTIVE_MIN_BATCH = 1
+ADAPTIVE_MAX_BATCH = 2000
+ADAPTIVE_STEP = 10
+ADAPTIVE_BACKOFF = 0.5
+ADAPTIVE_TARGET_RTT = 0.25
+
+# Latencia simulada del hardware: "fixed" (1 s / 2 s como los ws_*.py),
+# "realistic" o "none"; LATENCY_TRACE_FILE = CSV cmd,seconds con trazas medidas
+LATENCY_PROFILE = "fixed"
+LATENCY_TRACE_FILE = None
+
+# Servidor local de pruebas (ws_server.py); para usarlo: WS_URL = LOCAL_WS_URL
+LOCAL_HOST = "127.0.0.1"
+LOCAL_PORT = 7788
+LOCAL_WS_URL = f"ws://{LOCAL_HOST}:{LOCAL_PORT}/ws"
+
+# Almacén simulado de cada terminal (capacidades de devinfo y usuarios sembrados)
+STORE_USERSIZE = 3000
+STORE_LOGSIZE = 100000
+STORE_SEED_USERS = 1000
+# Logs sembrados con loggen.generate_log_columns (requiere numpy); 0 = 30 logs de ejemplo
+STORE_SEED_LOGS = 0
+
+# Registros por paquete en getalllog / getnewlog
+LOG_CHUNK_SIZE = 10
+
+# Codec JSON de los mensajes: "auto" (orjson > msgspec > json), "msgspec", "orjson" o "json"
+JSON_CODEC = "auto"
+
+# Logging de los simuladores (simlog.py): nivel "debug" / "info" / "warning" / "error",
+# LOG_FILE = None → stdout, formato "text" o "json"; los mensajes por trama
+# (paquetes, comandos recibidos) se muestrean: se escribe 1 de cada LOG_SAMPLE_EVERY
+LOG_LEVEL = "info"
+LOG_FILE = None
+LOG_FORMAT = "text"
+LOG_SAMPLE_EVERY = 1000
+LOG_QUEUE_SIZE = 100000
+
+# Reloj virtual de los terminales (clock.py): factor de aceleración y hora simulada
+# inicial ("YYYY-MM-DD HH:MM:SS"; None = ahora). 60 → una hora simulada por minuto real
+CLOCK_SPEEDUP = 1.0
+CLOCK_START = None
+
+# Inyección de fallos en la flota (faults.py): política por comando o None, parte de
+# los terminales a los que se aplica (0.02 = el 2 %) y semilla para elegirlos y
+# para sortear sus fallos (se mezcla con el SN de cada terminal)
+FAULTS = None
+FAULT_SHARE = 1.0
+FAULT_SEED = 0
@@ -0,0 +1,654 @@
+import asyncio
+import websockets
+import random
+from collections import deque
+
+import codec
+from batching import AimdBatch
+from clock import DeviceClock, loop_time, shared_clock
+from config import (WS_URL, TIMEOUT_SECONDS, DEVICE_MAX_INFLIGHT, DEVICE_QUEUE_SIZE,
+                    LATENCY_PROFILE, LATENCY_TRACE_FILE,
+                    RECONNECT, RECONNECT_BASE, RECONNECT_CAP, RECONNECT_MAX_ATTEMPTS,
+                    FLUSH_BATCH_SIZE, FLUSH_RATE, FLUSH_MAX_RETRIES, SENDLOG_ADAPTIVE,
+                    KEEPALIVE, PING_INTERVAL, IDLE_TIMEOUT, FAULT_SEED,
+                    STORE_USERSIZE, STORE_LOGSIZE, STORE_SEED_USERS, STORE_SEED_LOGS)
+from commands import HANDLERS, COMMAND_LANES, invoke, lookup
+from latency_model import SIZE_KIND, get_profile
+from loggen import generar_logs_realistas, generate_log_columns
+from message_templates import REGISTER_TEMPLATE, register_frame
+from metrics import observe
+from simlog import DEBUG, INFO, WARNING, ERROR, logger
+from store import DeviceStore, format_time
+from timerwheel import shared_wheel
+
+DEFAULT_DELAYS = get_profile(LATENCY_PROFILE, LATENCY_TRACE_FILE)
+KEEPALIVE_MODES = ("wheel", "task", "library", "off")
+
+
+def new_store(seed=None, clock=shared_clock) -> DeviceStore:
+    """Almacén con la capacidad de devinfo, sembrado con usuarios y logs de ejemplo."""
+    store = DeviceStore(STORE_USERSIZE, STORE_LOGSIZE)
+    store.seed_users(STORE_SEED_USERS)
+    if STORE_SEED_LOGS:
+        store.extend_logs(generate_log_columns(count=STORE_SEED_LOGS, end_date=clock.datetime(),
+                                               users=max(STORE_SEED_USERS, 1), seed=seed))
+    else:
+        for record in generar_logs_realistas(hoy=clock.datetime()):
+            store.append_log_record(record)
+    # Los logs sembrados son historia ya subida: no cuentan como atraso de sendlog
+    store.mark_logs_sent(store.next_seq())
+    return store
+
+
+async def wait_registered(sessions: list, tasks: list):
+    """
+    Espera a que cada sesión se haya registrado o haya terminado su primer
+    intento sin lograrlo (con reconexión sigue reintentando en segundo plano).
+    Cuenta sesiones, no eventos: los reintentos no adelantan el final.
+    """
+    while not all(s.registered_at is not None or s.attempts or t.done()
+                  for s, t in zip(sessions, tasks)):
+        await asyncio.sleep(0.05)
+
+
+# ------------------- SESIÓN DE DISPOSITIVO -------------------
+
+class PendingRequest:
+    """Comando propio (sendlog, senduser) enviado y aún sin ret."""
+
+    __slots__ = ("sent_at", "payload", "retries", "penalised")
+
+    def __init__(self, sent_at: float, payload: dict, retries: int = 0):
+        self.sent_at = sent_at
+        self.payload = payload
+        self.retries = retries      # reenvíos tras result:false (lotes del atraso)
+        self.penalised = False      # ya redujo el lote adaptativo (timeout o conexión perdida)
+
+
+class DeviceSession:
+    """
+    Un terminal simulado: conexión, registro, cola de mensajes y handlers.
+    Varias sesiones pueden convivir en el mismo loop de asyncio (modo flota).
+    """
+
+    __slots__ = ("sn", "url", "connect", "verbose", "stats", "latency", "handlers", "state",
+                 "faults", "fault_rng", "max_inflight", "queue_size", "inflight",
+                 "delays", "rng", "clock", "store", "reg_template", "pending", "ws", "queue",
+                 "connected_at", "registered_at", "reconnect", "timeline", "disconnected_at",
+                 "handshakes", "reg_rtt", "online", "flush_batch", "flush_rate",
+                 "flush_task", "flush_started", "rejected", "batcher", "ack_waiter",
+                 "keepalive", "wheel", "keepalive_timer", "last_seen", "attempts")
+
+    def __init__(self, sn: str, url: str = WS_URL, stats=None, latency=None,
+                 handlers=None, faults=None,
+                 max_inflight: int = DEVICE_MAX_INFLIGHT,
+                 queue_size: int = DEVICE_QUEUE_SIZE, delays=None, seed=None,
+                 store=None, clock=None, connect=None, reconnect: bool = RECONNECT,
+                 fault_seed=FAULT_SEED,
+                 timeline=None, handshakes=None, flush_batch: int = FLUSH_BATCH_SIZE,
+                 flush_rate: float = FLUSH_RATE, adaptive: bool = SENDLOG_ADAPTIVE,
+                 keepalive: str = KEEPALIVE, wheel=None, verbose: bool = True):
+        self.sn = sn
+        self.url = url
+        # Fábrica de conexiones: websockets.connect o un transporte en memoria (ws_sim.py)
+        self.connect = websockets.connect if connect is None else connect
+        self.verbose = verbose
+        # Tabla cmd → handler; por defecto el registro completo de commands.py
+        self.handlers = HANDLERS if handlers is None else handlers
+        # Estado libre para los handlers (índices de paginación, etc.)
+        self.state = {}
+        # Política de fallos de faults.py (None = responde siempre bien); su rng
+        # va aparte para no alterar la secuencia de latencias y fichajes, y mezcla
+        # la semilla de la prueba para que otra semilla sortee otros fallos
+        self.faults = faults
+        self.fault_rng = (random.Random(f"{fault_seed}:{sn if seed is None else seed}:faults")
+                          if faults is not None else None)
+        # 1 = un comando a la vez (como los ws_*.py); >1 = comandos en paralelo
+        self.max_inflight = max_inflight
+        # Cola acotada: si se llena, ws.recv() deja de leer (backpressure)
+        self.queue_size = queue_size
+        self.inflight = set()
+        # Modelo de latencia del hardware por comando (latency_model.py)
+        self.delays = DEFAULT_DELAYS if delays is None else delays
+        self.rng = random.Random(sn if seed is None else seed)
+        # Reloj virtual (clock.py): hora de fichajes y registro, esperas simuladas;
+        # vista propia sobre el compartido para que settime solo mueva este terminal
+        self.clock = DeviceClock(shared_clock if clock is None else clock)
+        # Usuarios y logs del terminal
+        self.store = new_store(self.rng.getrandbits(32), self.clock) if store is None else store
+        # Registro pre-serializado con el sn ya insertado
+        self.reg_template = REGISTER_TEMPLATE.bind(sn=sn)
+        # Comandos iniciados por el terminal esperando su ret: cmd → deque de
+        # PendingRequest; se reenvían si la conexión se cae antes del ret
+        self.pending = {}
+        # Contadores compartidos (collections.Counter) o None
+        self.stats = stats
+        # Histogramas compartidos {nombre: LatencyHistogram} o None
+        self.latency = latency
+        self.ws = None
+        self.queue = None
+        # Primer registro (muestra de la rampa, ramp.py): las reconexiones no lo pisan
+        self.connected_at = None
+        self.registered_at = None
+        self.reg_rtt = None
+        # Reconexión automática con backoff exponencial y jitter
+        self.reconnect = reconnect
+        # Intentos de conexión por segundo de loop (Counter compartido) o None
+        self.timeline = timeline
+        self.disconnected_at = None
+        self.attempts = 0       # intentos de conexión terminados (registrados o no)
+        # Semáforo compartido que limita los connect + registro simultáneos (ramp.py) o None
+        self.handshakes = handshakes
+        # Registrado y con la conexión abierta: los fichajes se envían al momento
+        self.online = False
+        # Atraso acumulado sin conexión: lotes de sendlog y tope de registros/s al vaciarlo
+        self.flush_batch = flush_batch
+        self.flush_rate = flush_rate
+        self.flush_task = None
+        self.flush_started = None
+        # Lotes del atraso rechazados (result:false) que vuelven a subirse: (records, reintentos)
+        self.rejected = deque()
+        # Lote adaptativo (AIMD) para vaciar el atraso, o None = lote fijo de flush_batch
+        self.batcher = AimdBatch(flush_batch) if adaptive else None
+        self.ack_waiter = None
+        # Pings e inactividad: "wheel" | "task" | "library" | "off" (config.KEEPALIVE);
+        # en modo "wheel" los temporizadores van a la rueda compartida del proceso
+        if keepalive not in KEEPALIVE_MODES:
+            raise ValueError(f"Keepalive desconocido: {keepalive}")
+        self.keepalive = keepalive
+        self.wheel = shared_wheel if wheel is None else wheel
+        self.keepalive_timer = None
+        self.last_seen = None   # último frame o pong recibido (loop_time)
+
+    def log(self, *args, level: int = INFO, cmd: str = None, sampled: bool = False, **fields):
+        """Registro con contexto (sn, cmd); sin verbose solo pasan avisos y errores."""
+        if (self.verbose or level >= WARNING) and logger.enabled(level):
+            logger.emit(level, " ".join(map(str, args)), sn=self.sn, cmd=cmd,
+                        sampled=sampled, **fields)
+
+    def count(self, key: str, n: int = 1):
+        if self.stats is not None:
+            self.stats[key] += n
+
+    def observe(self, name: str, seconds: float):
+        if self.latency is not None:
+            observe(self.latency, name, seconds)
+
+    def store_size(self, kind: str) -> int:
+        """Elementos en el almacén del terminal ("users" o "logs")."""
+        return self.store.user_count() if kind == "users" else self.store.log_count()
+
+    async def hardware_delay(self, cmd: str):
+        """Simula el tiempo que tarda el terminal en ejecutar `cmd`."""
+        model = self.delays.get(cmd)
+        if model is None:
+            return
+        kind = SIZE_KIND.get(cmd)
+        seconds = model.sample(self.rng, self.store_size(kind) if kind else 0)
+        if seconds > 0:
+            await self.clock.sleep(seconds)
+
+    def draw_fault(self, cmd: str):
+        """Fallo sorteado para la respuesta a `cmd`: (acción, argumento) o None."""
+        if self.faults is None:
+            return None
+        return self.faults.draw(cmd, self.fault_rng)
+
+    async def send(self, payload: dict):
+        await self.ws.send(codec.dumps(payload))
+        self.count("frames_out")
+
+    async def send_raw(self, frame: str):
+        """Envía un mensaje ya serializado (plantillas de message_templates)."""
+        await self.ws.send(frame)
+        self.count("frames_out")
+
+    async def send_request(self, payload: dict, intended: float = None, retries: int = 0):
+        """
+        Envía un comando propio (sendlog, senduser) y anota cuándo, para medir su ret.
+        `intended` = instante planificado (loop_time): en carga de lazo abierto la
+        latencia se mide desde ahí y no desde el envío real (omisión coordinada).
+        """
+        self.pending.setdefault(payload["cmd"], deque()).append(
+            PendingRequest(loop_time() if intended is None else intended, payload, retries))
+        if self.ws is None:
+            # Sin conexión: sale al reconectar, con el resto de pendientes
+            self.count(f"{payload['cmd']}_deferred")
+            return
+        await self.send(payload)
+
+    def punch(self, count: int, ts: int = None) -> list:
+        """Marca `count` fichajes nuevos en el almacén y los devuelve como records de sendlog."""
+        ts = int(self.clock.now()) if ts is None else ts
+        users = max(self.store.user_count(), 1)
+        return [self.punch_one(self.rng.randint(1, users), ts, self.rng.randint(0, 1))
+                for _ in range(count)]
+
+    def punch_one(self, enrollid: int, ts: int, inout: int = 0, mode: int = 0) -> dict:
+        """Un fichaje concreto (perfiles de turnos de workload.py)."""
+        self.store.append_log(enrollid, ts, mode, inout, 0)
+        return {"enrollid": enrollid, "time": format_time(ts), "mode": mode,
+                "inout": inout, "event": 0}
+
+    async def send_logs(self, records: list, intended: float = None):
+        """
+        Empuja al servidor (sendlog) fichajes recién guardados con punch / punch_one;
+        el ret llega por handle_ret_sendlog. Sin conexión, o mientras se vacía el
+        atraso, se quedan en el buffer de logs y salen en orden con flush_backlog.
+        """
+        if not self.online or self.flush_task is not None:
+            self.count("sendlog_buffered", len(records))
+            return
+        self.store.mark_logs_sent(self.store.next_seq())
+        await self.send_log_batch(records, intended)
+
+    async def send_log_batch(self, records: list, intended: float = None, retries: int = 0):
+        self.count("sendlog_sent")
+        self.count("sendlog_records", len(records))
+        await self.send_request({"cmd": "sendlog", "count": len(records), "record": records},
+                                intended, retries)
+
+    async def flush_backlog(self):
+        """
+        Sube los logs guardados sin conexión en lotes de `flush_batch`, a
+        `flush_rate` registros/s como mucho; los fichajes que llegan mientras
+        tanto se suman al atraso y los lotes rechazados salen antes que el resto.
+        Termina (métrica "flush") con el último ret.
+        """
+        if self.flush_started is None:
+            self.flush_started = loop_time()
+        lost = self.store.overwritten_unsent()
+        if lost:
+            self.log("⚠️ Atraso mayor que el buffer, logs perdidos:", lost, level=WARNING,
+                     cmd="sendlog")
+            self.count("logs_overwritten", lost)
+            self.store.mark_logs_sent(self.store.oldest_seq())
+        try:
+            while self.rejected or self.store.unsent_count():
+                if self.rejected:
+                    records, retries = self.rejected.popleft()
+                    self.count("flush_retried_records", len(records))
+                else:
+                    size = self.flush_batch if self.batcher is None else self.batcher.size
+                    start = self.store.unsent_seq()
+                    records = self.store.log_range(start, start + size)
+                    self.store.mark_logs_sent(start + len(records))
+                    self.count("flush_records", len(records))
+                    retries = 0
+                await self.send_log_batch(records, retries=retries)
+                if self.batcher is not None:
+                    await self.wait_sendlog_acks()
+                if self.flush_rate:
+                    await asyncio.sleep(len(records) / self.flush_rate)
+        except websockets.ConnectionClosed:
+            return      # lo enviado sin ret sigue en pending y se reenvía al reconectar
+        finally:
+            if self.flush_task is asyncio.current_task():
+                self.flush_task = None
+        if not self.pending.get("sendlog"):
+            self.flush_done()
+
+    async def wait_sendlog_acks(self):
+        """Lote adaptativo: espera el ret de lo enviado antes del siguiente lote."""
+        if not self.pending.get("sendlog"):
+            return
+        self.ack_waiter = asyncio.get_running_loop().create_future()
+        try:
+            await asyncio.wait_for(self.ack_waiter, TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            self.count("sendlog_ack_timeout")
+            self.penalise_sendlog()
+        finally:
+            self.ack_waiter = None
+
+    def penalise_sendlog(self):
+        """Lotes sendlog en vuelo que llegan tarde o se pierden: una sola reducción por lote."""
+        fresh = [r for r in self.pending.get("sendlog", ()) if not r.penalised]
+        if fresh:
+            self.batcher.decrease()
+            for request in fresh:
+                request.penalised = True
+
+    def flush_done(self):
+        self.observe("flush", loop_time() - self.flush_started)
+        self.count("flush_completed")
+        self.flush_started = None
+
+    def acknowledge(self, cmd: str, ok: bool = True):
+        """Llega el ret de un comando propio: latencia up:<cmd> (el servidor responde en orden)."""
+        queue = self.pending.get(cmd)
+        if not queue:
+            self.count("unexpected_ret")
+            return
+        request = queue.popleft()
+        payload = request.payload
+        rtt = loop_time() - request.sent_at
+        self.observe(f"up:{cmd}", rtt)
+        if cmd != "sendlog":
+            return
+        if not ok and self.flush_started is not None:
+            self.retry_batch(request)
+        if self.batcher is not None and self.flush_task is not None:
+            # Solo los lotes del atraso (uno en vuelo) ajustan el tamaño
+            self.batcher.on_ack(rtt, ok, payload["count"], request.penalised)
+            if not queue and self.ack_waiter is not None and not self.ack_waiter.done():
+                self.ack_waiter.set_result(None)
+        if not queue and self.flush_started is not None and self.flush_task is None:
+            self.flush_done()
+
+    def retry_batch(self, request: PendingRequest):
+        """Lote del atraso con result:false: vuelve a la cola de subida o se da por perdido."""
+        records = request.payload["record"]
+        if request.retries >= FLUSH_MAX_RETRIES:
+            self.log("⚠️ Lote rechazado", request.retries + 1, "veces, registros perdidos:",
+                     len(records), level=WARNING, cmd="sendlog", sampled=True)
+            self.count("sendlog_lost_records", len(records))
+            return
+        self.rejected.append((records, request.retries + 1))
+        if self.flush_task is None and self.online:
+            self.flush_task = asyncio.create_task(self.flush_backlog())
+
+    async def send_registration(self, opened: float) -> bool:
+        """Envía el registro del dispositivo y espera la respuesta 'ret reg'."""
+        sent_at = loop_time()
+        await self.ws.send(register_frame(self.reg_template, self.store.counts(), self.clock))
+        try:
+            response = await asyncio.wait_for(self.ws.recv(), timeout=TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            self.log("⚠️ No se recibió respuesta al registro.", level=WARNING, cmd="reg")
+            self.count("reg_timeout")
+            return False
+
+        self.log("📩 Respuesta de registro:", response, cmd="reg")
+        reply = self.decode(response)
+        if reply is None or reply.get("ret") != "reg" or not reply.get("result"):
+            # Rechazado (sn no válido, servidor saturado...) o respuesta inesperada:
+            # se cierra y run() reintenta con backoff
+            self.log("⚠️ Registro rechazado:", response[:200], level=WARNING, cmd="reg")
+            self.count("reg_rejected")
+            await self.ws.close()
+            return False
+
+        now = loop_time()
+        self.observe("up:reg", now - sent_at)
+        self.count("registered")
+        if self.registered_at is None:
+            self.connected_at = opened
+            self.registered_at = now
+            self.reg_rtt = now - sent_at
+        if self.disconnected_at is not None:
+            # Tiempo sin servicio: desde que se cayó la conexión hasta volver a estar registrado
+            self.observe("reconnect", now - self.disconnected_at)
+            self.count("reconnected")
+            self.disconnected_at = None
+        return True
+
+    async def resend_pending(self):
+        """Tras reconectar, reenvía en orden los comandos propios que no recibieron ret."""
+        if self.batcher is not None:
+            self.penalise_sendlog()     # lote perdido con la conexión
+        for cmd, queue in self.pending.items():
+            for request in list(queue):
+                await self.send(request.payload)
+                self.count(f"{cmd}_resent")
+
+    def backoff(self, attempt: int) -> float:
+        """Espera antes del intento `attempt` (1, 2, ...): jitter completo sobre base·2^n con tope."""
+        return self.rng.uniform(0, min(RECONNECT_CAP, RECONNECT_BASE * 2 ** (attempt - 1)))
+
+    def decode(self, message):
+        try:
+            data = codec.loads(message)
+        except codec.DECODE_ERRORS:
+            data = None
+        if not isinstance(data, dict):
+            self.log("⚠️ Mensaje inválido (no JSON):", message[:200], level=WARNING)
+            self.count("bad_frames")
+            return None
+        return data
+
+    def route(self, message):
+        """
+        (tipo, nombre, handler) mirando solo la clave cmd/ret del mensaje crudo.
+        Devuelve None si el mensaje se descarta (sin handler o JSON inválido).
+        """
+        kind, name = codec.peek(message)
+        if kind is None:
+            # Sin cmd/ret reconocible: decodificación completa para confirmarlo
+            data = self.decode(message)
+            if data is None:
+                return None
+            kind = "cmd" if "cmd" in data else "ret"
+            name = data.get(kind) or "unknown"
+
+        fn = lookup(self, kind, name)
+        if fn is None:
+            # Comando que no atendemos: se ignora sin decodificar el cuerpo
+            self.log("⚙️ Comando no reconocido, ignorando", level=DEBUG, cmd=name, sampled=True)
+            self.count("ignored")
+            return None
+        return kind, name, fn
+
+    def body(self, message, kind, name, fn):
+        """Cuerpo decodificado, solo si el handler lo necesita (handler(..., body=False))."""
+        if kind == "cmd" and not getattr(fn, "needs_body", True):
+            return {"cmd": name}
+        return self.decode(message)
+
+    async def handle_server_message(self, message):
+        """Despacha un mensaje del servidor a su handler."""
+        routed = self.route(message)
+        if routed is None:
+            return
+        kind, name, fn = routed
+        data = self.body(message, kind, name, fn)
+        if data is not None:
+            self.log("📨 Mensaje recibido", level=DEBUG, cmd=name, sampled=True)
+            await invoke(self, name, fn, data)
+
+    async def message_consumer(self):
+        """Consume mensajes de la cola: en serie o con hasta `max_inflight` a la vez."""
+        if self.max_inflight <= 1:
+            while True:
+                message = await self.queue.get()
+                try:
+                    await self.handle_server_message(message)
+                except websockets.ConnectionClosed:
+                    return
+                except Exception as ex:
+                    # Un handler roto no puede parar el consumidor: la cola acotada
+                    # se llenaría y ws.recv() quedaría bloqueado para siempre
+                    self.log("❌ Error en handler:", repr(ex), level=ERROR)
+                    self.count("handler_errors")
+                finally:
+                    self.queue.task_done()
+
+        # Solo los handlers en ejecución ocupan `slots`; los que esperan a su
+        # predecesor de carril no, así no bloquean a los comandos sin carril.
+        # `admitted` acota además los que esperan (como la cola de recepción)
+        slots = asyncio.Semaphore(self.max_inflight)
+        admitted = asyncio.Semaphore(self.max_inflight + self.queue_size)
+        lanes = {}  # carril → última tarea encolada en ese carril
+        while True:
+            message = await self.queue.get()
+            self.queue.task_done()
+            routed = self.route(message)
+            if routed is None:
+                continue
+
+            # Sin cupo no se saca nada más de la cola → la cola se llena → se deja de leer el socket
+            await admitted.acquire()
+            lane = COMMAND_LANES.get(routed[1]) if routed[0] == "cmd" else None
+            previous = lanes.get(lane) if lane else None
+            task = self.spawn(self._run_inflight(message, routed, previous, slots, admitted))
+            if lane:
+                lanes[lane] = task
+
+    async def _run_inflight(self, message, routed, previous, slots, admitted):
+        try:
+            # Mismo carril → se respeta el orden de llegada; el cupo se toma después
+            if previous is not None and not previous.done():
+                await asyncio.wait([previous])
+            async with slots:
+                await self._run_handler(message, routed)
+        finally:
+            admitted.release()
+
+    async def _run_handler(self, message, routed):
+        try:
+            kind, name, fn = routed
+            data = self.body(message, kind, name, fn)
+            if data is not None:
+                self.log("📨 Mensaje recibido", level=DEBUG, cmd=name, sampled=True)
+                await invoke(self, name, fn, data)
+        except websockets.ConnectionClosed:
+            pass
+        except Exception as ex:
+            self.log("❌ Error en handler:", repr(ex), level=ERROR, cmd=routed[1])
+            self.count("handler_errors")
+
+    # ------------------- KEEPALIVE -------------------
+
+    def start_keepalive(self, ws):
+        self.last_seen = loop_time()
+        if self.keepalive == "wheel":
+            self.keepalive_timer = self.wheel.schedule(PING_INTERVAL, self.heartbeat, ws)
+
+    def heartbeat(self, ws):
+        """
+        Cada PING_INTERVAL s (desde la rueda o tras un wait_for vencido): ping,
+        o cierre si no ha llegado nada (ni frames ni pong) en IDLE_TIMEOUT s.
+        """
+        if ws is not self.ws:
+            return
+        if loop_time() - self.last_seen >= IDLE_TIMEOUT:
+            self.log("💤 Conexión inactiva: se cierra", level=WARNING, sampled=True,
+                     idle=round(loop_time() - self.last_seen, 1))
+            self.count("idle_timeouts")
+            self.spawn(ws.close())
+            return
+        self.spawn(self.ping(ws))
+        if self.keepalive == "wheel":
+            self.keepalive_timer = self.wheel.schedule(PING_INTERVAL, self.heartbeat, ws)
+
+    async def ping(self, ws):
+        try:
+            pong = await ws.ping()
+            self.count("pings")
+            await pong
+        except websockets.ConnectionClosed:
+            return
+        self.last_seen = loop_time()
+        self.count("pongs")
+
+    def spawn(self, coro) -> asyncio.Task:
+        """Tarea ligada a la conexión: se cancela al cerrarse (comandos, pings)."""
+        task = asyncio.create_task(coro)
+        self.inflight.add(task)
+        task.add_done_callback(self.inflight.discard)
+        return task
+
+    async def run(self):
+        """
+        Conecta, registra y atiende comandos. Si la conexión se cae (o no llega a
+        establecerse) y `reconnect` está activo, vuelve a intentarlo con backoff;
+        el almacén (marca de getnewlog) y los sendlog sin ret se conservan.
+        """
+        attempt = 0
+        while True:
+            if await self.run_connection():
+                attempt = 0
+            if not self.reconnect:
+                return
+            attempt += 1
+            if RECONNECT_MAX_ATTEMPTS and attempt > RECONNECT_MAX_ATTEMPTS:
+                self.log("❌ Sin conexión tras", RECONNECT_MAX_ATTEMPTS, "intentos", level=ERROR)
+                self.count("reconnect_gave_up")
+                return
+            delay = self.backoff(attempt)
+            self.log("🔁 Reconectando", level=DEBUG, sampled=True, attempt=attempt,
+                     delay=round(delay, 3))
+            self.count("reconnect_attempts")
+            await asyncio.sleep(delay)
+
+    async def run_connection(self) -> bool:
+        """Una conexión completa: conectar, registrar y atender. True si llegó a registrarse."""
+        self.log(f"🔗 Conectando a {self.url} ...")
+        if self.timeline is not None:
+            self.timeline[int(loop_time())] += 1
+        registered = False
+        consumer = None
+        gate = self.handshakes
+        if gate is not None:
+            await gate.acquire()
+        try:
+            # Con keepalive propio se desactivan los pings de websockets
+            options = {} if self.keepalive == "library" else {"ping_interval": None}
+            async with self.connect(self.url, **options) as ws:
+                self.ws = ws
+                opened = loop_time()
+                self.count("connected")
+                self.log("✅ Conexión establecida")
+
+                registered = await self.send_registration(opened)
+                if gate is not None:
+                    gate.release()
+                    gate = None
+                if not registered:
+                    return False
+                self.queue = asyncio.Queue(maxsize=self.queue_size)
+                consumer = asyncio.create_task(self.message_consumer())
+                await self.resend_pending()
+                if self.rejected or self.store.unsent_count():
+                    self.flush_task = asyncio.create_task(self.flush_backlog())
+                self.online = True
+                self.start_keepalive(ws)
+
+                while True:
+                    try:
+                        if self.keepalive == "task":
+                            try:
+                                message = await asyncio.wait_for(ws.recv(), timeout=PING_INTERVAL)
+                            except asyncio.TimeoutError:
+                                self.heartbeat(ws)
+                                continue
+                        else:
+                            message = await ws.recv()
+                        self.last_seen = loop_time()
+                        self.count("frames_in")
+                        await self.queue.put(message)
+                    except websockets.ConnectionClosed:
+                        self.log("🔌 Conexión cerrada por el servidor.")
+                        self.count("closed")
+                        break
+
+        except asyncio.CancelledError:
+            raise
+        except (OSError, websockets.InvalidHandshake, websockets.ConnectionClosed) as ex:
+            # Servidor caído o reiniciando: esperado durante una tormenta de reconexiones
+            # (solo se avisa si el terminal nunca llegó a registrarse)
+            self.log("⚠️ Fallo de conexión:", repr(ex), sampled=True,
+                     level=WARNING if self.registered_at is None else DEBUG)
+            self.count("connect_failed")
+        except Exception as ex:
+            self.log("❌ Error general:", repr(ex), level=ERROR)
+            self.count("errors")
+        finally:
+            self.online = False
+            if self.keepalive_timer is not None:
+                self.keepalive_timer.cancel()
+                self.keepalive_timer = None
+            if self.flush_task is not None:
+                self.flush_task.cancel()
+                self.flush_task = None
+            if gate is not None:
+                gate.release()
+            if consumer is not None:
+                consumer.cancel()
+            for task in list(self.inflight):
+                task.cancel()
+            self.ws = None
+            self.attempts += 1
+            if registered:
+                self.disconnected_at = loop_time()
+        return registered
@@ -0,0 +1,94 @@
+# faults.py
+# Inyección de fallos en las respuestas de los terminales simulados.
+# Sustituye al SIMULAR_ERROR de los ws_*.py (todo result:false en un script):
+# aquí cada comando tiene su regla con probabilidad de error (con su reason),
+# respuesta perdida, retrasada, duplicada o corte de la conexión. La política
+# se asigna a un terminal o a una parte de la flota, y los sorteos usan un
+# rng sembrado por terminal, así una prueba con la misma semilla se repite.
+#
+# Formato (dict o JSON): "*" es la regla por defecto; el resto, por comando
+#   {"*": {"error": 0.02, "reasons": [1, 2]},
+#    "getnewlog": {"drop": 0.05, "delay": 0.05, "delay_seconds": [3, 8]},
+#    "opendoor": {"disconnect": 0.01}}
+import json
+import os
+import random
+
+# Orden del sorteo: un único número aleatorio decide qué fallo (o ninguno) toca
+ACTIONS = ("error", "drop", "delay", "duplicate", "disconnect")
+
+
+class FaultRule:
+    """Probabilidad de cada fallo por respuesta de un comando (excluyentes entre sí)."""
+
+    __slots__ = ("error", "reasons", "drop", "delay", "delay_seconds", "duplicate", "disconnect")
+
+    def __init__(self, error: float = 0.0, reasons=(1,), drop: float = 0.0, delay: float = 0.0,
+                 delay_seconds=(1.0, 10.0), duplicate: float = 0.0, disconnect: float = 0.0):
+        self.error = error
+        self.reasons = tuple(reasons)           # reason de las respuestas result:false
+        self.drop = drop                        # la respuesta no se envía
+        self.delay = delay
+        self.delay_seconds = tuple(delay_seconds)   # (mín, máx) segundos reales de retraso
+        self.duplicate = duplicate              # la respuesta se envía dos veces
+        self.disconnect = disconnect            # se cierra la conexión en lugar de responder
+        if sum(getattr(self, action) for action in ACTIONS) > 1:
+            raise ValueError("La suma de probabilidades de una regla no puede pasar de 1")
+
+    def draw(self, rng: random.Random):
+        """(acción, argumento) del fallo sorteado, o None si la respuesta sale bien."""
+        r = rng.random()
+        for action in ACTIONS:
+            p = getattr(self, action)
+            if r < p:
+                if action == "error":
+                    return action, rng.choice(self.reasons)
+                if action == "delay":
+                    return action, rng.uniform(*self.delay_seconds)
+                return action, None
+            r -= p
+        return None
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class FaultPolicy:
+    """Reglas por comando con una regla por defecto ("*")."""
+
+    __slots__ = ("rules", "default")
+
+    def __init__(self, rules: dict = None, default: FaultRule = None):
+        self.rules = rules or {}
+        self.default = default
+
+    @classmethod
+    def from_dict(cls, spec: dict) -> "FaultPolicy":
+        spec = dict(spec)
+        default = spec.pop("*", None)
+        return cls({cmd: FaultRule(**rule) for cmd, rule in spec.items()},
+                   FaultRule(**default) if default is not None else None)
+
+    def draw(self, cmd: str, rng: random.Random):
+        rule = self.rules.get(cmd, self.default)
+        return None if rule is None else rule.draw(rng)
+
+    def to_dict(self) -> dict:
+        spec = {cmd: rule.to_dict() for cmd, rule in self.rules.items()}
+        if self.default is not None:
+            spec["*"] = self.default.to_dict()
+        return spec
+
+
+def load_policy(text: str) -> FaultPolicy:
+    """Política desde un fichero JSON o desde el JSON escrito en la línea de comandos."""
+    if os.path.exists(text):
+        with open(text) as f:
+            return FaultPolicy.from_dict(json.load(f))
+    return FaultPolicy.from_dict(json.loads(text))
+
+
+def pick_faulty(sns: list, share: float, seed=None) -> set:
+    """Los `share` × len(sns) terminales que fallan, elegidos con la semilla."""
+    count = min(len(sns), round(share * len(sns)))
+    return set(random.Random(seed).sample(sns, count))
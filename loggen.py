@@ -0,0 +1,115 @@
+# loggen.py
+# Generación de registros de asistencia simulados.
+import math
+import time
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: solo hace falta para sembrar en volumen
+    np = None
+
+
+def generar_logs_realistas(usuarios=(1, 4, 5), dias: int = 5, hoy: datetime = None):
+    """
+    Genera registros (entradas/salidas) de prueba para los usuarios
+    indicados, uno de entrada y uno de salida por día hasta `hoy`.
+    """
+    logs = []
+    base_date = (hoy or datetime.now()).replace(hour=9, minute=0, second=0, microsecond=0)
+
+    for user_id in usuarios:
+        for i in range(dias):
+            fecha = base_date - timedelta(days=i)
+
+            entrada = fecha + timedelta(minutes=user_id * 2)
+            salida = entrada + timedelta(hours=8)
+
+            logs.append({
+                "enrollid": user_id,
+                "time": entrada.strftime("%Y-%m-%d %H:%M:%S"),
+                "mode": 0,  # huella
+                "inout": 0,  # entrada
+                "event": 0
+            })
+            logs.append({
+                "enrollid": user_id,
+                "time": salida.strftime("%Y-%m-%d %H:%M:%S"),
+                "mode": 0,
+                "inout": 1,  # salida
+                "event": 0
+            })
+
+    logs.sort(key=lambda x: x["time"])
+    return logs
+
+
+# ------------------- GENERACIÓN VECTORIZADA -------------------
+# Para sembrar 100 000 logs en miles de terminales: columnas NumPy
+# (enrollid / time / mode / inout / event) sin crear un dict por registro.
+# Los dicts y el JSON se generan después, solo para el paquete que se envía
+# (DeviceStore.log_at), por lo que aquí no se materializa nada.
+
+
+def generate_log_columns(count: int = None, days: int = 30, users: int = 100,
+                         user_start: int = 1, seed=None, end_date: datetime = None,
+                         shift_start: float = 9.0, shift_hours: float = 8.0,
+                         jitter_minutes: float = 7.0, attendance: float = 0.92,
+                         weekends: bool = False, mode_weights=(1.0,)) -> dict:
+    """
+    Genera logs de asistencia por columnas: una entrada y una salida por
+    usuario y día trabajado, alrededor de `shift_start` (hora decimal) con
+    dispersión normal, ausencias según `attendance` y fines de semana libres.
+    Con `count` se calculan los días necesarios y se devuelven los `count`
+    registros más recientes. `mode_weights[i]` = probabilidad del modo i.
+    """
+    if np is None:
+        raise ImportError("generate_log_columns necesita numpy (pip install numpy)")
+
+    rng = np.random.default_rng(seed)
+    if count is not None:
+        per_day = 2 * users * attendance * (1.0 if weekends else 5 / 7)
+        days = max(1, math.ceil(count / per_day) + 7)
+
+    end_date = end_date or datetime.now()
+    until = int(time.mktime(end_date.timetuple()))   # nada posterior a end_date
+    end_date = end_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    day_starts = []
+    for i in range(days - 1, -1, -1):
+        day = end_date - timedelta(days=i)
+        if weekends or day.weekday() < 5:
+            day_starts.append(int(time.mktime(day.timetuple())))
+    day_starts = np.array(day_starts, dtype=np.int64)
+
+    shape = (len(day_starts), users)
+    present = rng.random(shape) < attendance
+    # Cada usuario tiene su costumbre (llega antes o después) más el ruido del día
+    habit = rng.normal(0.0, jitter_minutes / 2, users)
+    entry = (shift_start * 3600 + (habit + rng.normal(0.0, jitter_minutes, shape)) * 60
+             + rng.integers(0, 60, shape))
+    exit_ = entry + shift_hours * 3600 + rng.normal(5.0, 10.0, shape) * 60
+
+    base = day_starts[:, None]
+    times = np.concatenate([(base + entry)[present], (base + exit_)[present]]).astype(np.int64)
+    ids = np.broadcast_to(np.arange(user_start, user_start + users, dtype=np.uint32), shape)
+    enrollid = np.concatenate([ids[present], ids[present]])
+    inout = np.concatenate([np.zeros(present.sum(), dtype=np.uint8),
+                            np.ones(present.sum(), dtype=np.uint8)])
+
+    order = np.argsort(times, kind="stable")
+    order = order[times[order] <= until]
+    if count is not None:
+        # order[-0:] sería el array entero: count <= 0 → ningún registro
+        order = order[-count:] if count > 0 else order[:0]
+    n = len(order)
+
+    weights = np.asarray(mode_weights, dtype=float)
+    mode = rng.choice(len(weights), size=n, p=weights / weights.sum()).astype(np.uint8)
+
+    return {
+        "enrollid": enrollid[order],
+        "time": times[order].astype(np.uint32),
+        "mode": mode,
+        "inout": inout[order],
+        "event": np.zeros(n, dtype=np.uint8),
+    }
@@ -1,9 +1,18 @@
 # message_templates.py
+import json
+import re
+import time
 from datetime import datetime
+from json.encoder import encode_basestring_ascii
 
-def get_valid_register(sn: str = "ZX0006827500") -> dict:
-    """Devuelve un mensaje válido de registro con timestamp actual."""
-    return {
+from clock import shared_clock
+
+def get_valid_register(sn: str = "ZX0006827500", **devinfo) -> dict:
+    """
+    Devuelve un mensaje válido de registro con timestamp actual.
+    `devinfo` sobrescribe campos del devinfo (p. ej. los contadores used*).
+    """
+    msg = {
         "cmd": "reg",
         "sn": sn,
         "devinfo": {
@@ -24,6 +33,8 @@ def get_valid_register(sn: str = "ZX0006827500") -> dict:
             "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         },
     }
+    msg["devinfo"].update(devinfo)
+    return msg
 
 INVALID_REGISTER = {
     "cmd": "reg",
@@ -32,3 +43,96 @@ INVALID_REGISTER = {
 }
 
 MALFORMED_JSON = '{"cmd": "reg", "sn": "BAD_SN", "devinfo": {"modelname":"tfs30"'
+
+
+# ------------------- PLANTILLAS PRE-SERIALIZADAS -------------------
+# Los mensajes se codifican una sola vez; en cada envío solo se insertan
+# los campos variables (sn, time, contadores, ...) entre los trozos fijos.
+
+def _encode_value(value) -> str:
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if isinstance(value, str):
+        return encode_basestring_ascii(value)
+    if isinstance(value, int):
+        return str(value)
+    return json.dumps(value)
+
+
+def field(name: str) -> str:
+    """Marca un campo variable dentro del dict de una plantilla."""
+    return f"@@{name}@@"
+
+
+class FrameTemplate:
+    """Mensaje JSON pre-codificado con huecos para los campos variables."""
+
+    __slots__ = ("parts", "fields")
+
+    def __init__(self, parts: tuple, fields: tuple):
+        self.parts = parts      # len(parts) == len(fields) + 1
+        self.fields = fields
+
+    @classmethod
+    def from_payload(cls, payload: dict) -> "FrameTemplate":
+        text = json.dumps(payload)
+        pieces = re.split(r'"@@(\w+)@@"', text)
+        return cls(tuple(pieces[0::2]), tuple(pieces[1::2]))
+
+    def render(self, **values) -> str:
+        parts = self.parts
+        out = [parts[0]]
+        for i, name in enumerate(self.fields):
+            out.append(_encode_value(values[name]))
+            out.append(parts[i + 1])
+        return "".join(out)
+
+    def bind(self, **values) -> "FrameTemplate":
+        """Fija algunos campos (p. ej. el sn de un terminal) y devuelve otra plantilla."""
+        parts = [self.parts[0]]
+        fields = []
+        for i, name in enumerate(self.fields):
+            if name in values:
+                parts[-1] += _encode_value(values[name]) + self.parts[i + 1]
+            else:
+                fields.append(name)
+                parts.append(self.parts[i + 1])
+        return FrameTemplate(tuple(parts), tuple(fields))
+
+
+_now_cache = [0, ""]
+
+
+def current_time(clock=shared_clock) -> str:
+    """Hora (del reloj virtual) formateada, recalculada como mucho una vez por segundo."""
+    now = int(clock.now())
+    if now != _now_cache[0]:
+        _now_cache[0] = now
+        _now_cache[1] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
+    return _now_cache[1]
+
+
+COUNTER_FIELDS = ("useduser", "usedfp", "usedcard", "usedpwd", "usedlog", "usednewlog")
+
+REGISTER_TEMPLATE = FrameTemplate.from_payload(get_valid_register(
+    field("sn"), time=field("time"), **{name: field(name) for name in COUNTER_FIELDS}))
+
+
+def register_frame(template: FrameTemplate, counts: dict, clock=shared_clock) -> str:
+    """Registro listo para enviar a partir de REGISTER_TEMPLATE (o una versión con sn fijado)."""
+    return template.render(time=current_time(clock), **counts)
+
+
+_ack_frames = {}
+
+
+def ack_frame(cmd: str, ok: bool = True) -> str:
+    """{"ret": cmd, "result": ...} ya serializado (se codifica una vez por comando)."""
+    key = (cmd, ok)
+    frame = _ack_frames.get(key)
+    if frame is None:
+        payload = {"ret": cmd, "result": True} if ok else {"ret": cmd, "result": False, "reason": 1}
+        frame = _ack_frames[key] = json.dumps(payload)
+    return frame
@@ -0,0 +1,154 @@
+# metrics.py
+# Histogramas de latencia log-lineales (estilo HDR): registro O(1),
+# memoria acotada y fusión simple entre workers de la flota.
+# Nombres de histograma por dirección y comando:
+#   up:<cmd>    terminal → servidor → ret (reg, sendlog, senduser), medido en el terminal
+#   down:<cmd>  servidor → terminal → ret (opendoor, getalllog, ...), medido en el servidor
+#   proc:<cmd>  tiempo del handler en el terminal (incluye la latencia simulada del hardware)
+import asyncio
+import json
+
+from simlog import logger
+
+SUB_BUCKET_BITS = 7                 # 128 sub-buckets → error relativo < 1.6 %
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HALF_BUCKETS = SUB_BUCKETS >> 1
+
+REPORT_PERCENTILES = (50, 90, 99, 99.9)
+
+
+def _bucket_index(us: int) -> int:
+    if us < SUB_BUCKETS:
+        return us
+    shift = us.bit_length() - SUB_BUCKET_BITS
+    return SUB_BUCKETS + (shift - 1) * HALF_BUCKETS + ((us >> shift) - HALF_BUCKETS)
+
+
+def _bucket_upper(index: int) -> int:
+    """Mayor valor (µs) que cae en el bucket `index`."""
+    if index < SUB_BUCKETS:
+        return index
+    shift = (index - SUB_BUCKETS) // HALF_BUCKETS + 1
+    mantissa = (index - SUB_BUCKETS) % HALF_BUCKETS + HALF_BUCKETS
+    return ((mantissa + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """Histograma de latencias en microsegundos con buckets dispersos."""
+
+    __slots__ = ("counts", "total", "min_us", "max_us", "sum_us")
+
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+        self.min_us = None
+        self.max_us = 0
+        self.sum_us = 0
+
+    def record(self, seconds: float):
+        us = int(seconds * 1_000_000)
+        if us < 0:
+            us = 0
+        idx = _bucket_index(us)
+        self.counts[idx] = self.counts.get(idx, 0) + 1
+        self.total += 1
+        self.sum_us += us
+        if us > self.max_us:
+            self.max_us = us
+        if self.min_us is None or us < self.min_us:
+            self.min_us = us
+
+    def merge(self, other: "LatencyHistogram"):
+        for idx, n in other.counts.items():
+            self.counts[idx] = self.counts.get(idx, 0) + n
+        self.total += other.total
+        self.sum_us += other.sum_us
+        self.max_us = max(self.max_us, other.max_us)
+        if other.min_us is not None:
+            self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+        return self
+
+    def percentile(self, p: float) -> float:
+        """Percentil `p` (0–100) en segundos."""
+        return self.percentiles((p,))[0]
+
+    def percentiles(self, ps=REPORT_PERCENTILES) -> list:
+        """Varios percentiles (segundos) en una sola pasada por los buckets."""
+        if not self.total:
+            return [0.0] * len(ps)
+        ranks = sorted((max(1, int(round(p / 100.0 * self.total))), i) for i, p in enumerate(ps))
+        values = [self.max_us / 1_000_000] * len(ps)
+        pos = seen = 0
+        for idx in sorted(self.counts):
+            seen += self.counts[idx]
+            while pos < len(ranks) and seen >= ranks[pos][0]:
+                values[ranks[pos][1]] = min(_bucket_upper(idx), self.max_us) / 1_000_000
+                pos += 1
+            if pos == len(ranks):
+                break
+        return values
+
+    def mean(self) -> float:
+        return self.sum_us / self.total / 1_000_000 if self.total else 0.0
+
+    def to_dict(self) -> dict:
+        return {"counts": self.counts, "total": self.total, "min_us": self.min_us,
+                "max_us": self.max_us, "sum_us": self.sum_us}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LatencyHistogram":
+        h = cls()
+        h.counts = {int(k): v for k, v in data["counts"].items()}
+        h.total = data["total"]
+        h.min_us = data["min_us"]
+        h.max_us = data["max_us"]
+        h.sum_us = data["sum_us"]
+        return h
+
+    def stats(self) -> dict:
+        """n, media, percentiles de REPORT_PERCENTILES y máximo, en milisegundos."""
+        data = {"n": self.total, "mean_ms": round(self.mean() * 1000, 3)}
+        for p, value in zip(REPORT_PERCENTILES, self.percentiles()):
+            data[f"p{p:g}_ms"] = round(value * 1000, 3)
+        data["max_ms"] = round(self.max_us / 1000, 3)
+        return data
+
+    def summary(self) -> str:
+        if not self.total:
+            return "sin muestras"
+        parts = [f"n={self.total}"]
+        for p, value in zip(REPORT_PERCENTILES, self.percentiles()):
+            parts.append(f"p{p:g}={value * 1000:.1f}ms")
+        parts.append(f"max={self.max_us / 1000:.1f}ms")
+        return " ".join(parts)
+
+
+# ------------------- COLECCIONES {nombre: histograma} -------------------
+
+def observe(latency: dict, name: str, seconds: float):
+    """Registra una muestra en el histograma `name`, creándolo si no existe."""
+    hist = latency.get(name)
+    if hist is None:
+        hist = latency[name] = LatencyHistogram()
+    hist.record(seconds)
+
+
+def latency_stats(latency: dict) -> dict:
+    return {name: hist.stats() for name, hist in sorted(latency.items())}
+
+
+def write_latency_report(path: str, latency: dict, **extra):
+    """Exporta percentiles e histogramas completos (fusionables) a un JSON."""
+    data = dict(extra)
+    data["stats"] = latency_stats(latency)
+    data["histograms"] = {name: hist.to_dict() for name, hist in latency.items()}
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+async def report_periodically(latency: dict, interval: float, label: str = "latencia"):
+    """Escribe en el log los percentiles acumulados cada `interval` segundos."""
+    while True:
+        await asyncio.sleep(interval)
+        for name, stats in latency_stats(latency).items():
+            logger.info(f"⏱️ {label} {name}", **stats)
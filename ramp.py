@@ -0,0 +1,145 @@
+# ramp.py
+# Arranque escalonado de la flota: en lugar de lanzar todos los connect +
+# registro a la vez (eso mide la cola SYN del balanceador), las sesiones se
+# lanzan según un perfil y con un tope de handshakes simultáneos. Durante la
+# rampa se mide el RTT del registro por ventana de tiempo frente a la tasa de
+# conexiones lograda, para encontrar el "codo" en el que el servidor se satura.
+#
+#   burst   grupos de `burst_size` sesiones cada `interval` s (0 = todas a la vez)
+#   linear  `rate` conexiones/s constantes
+#   step    escalera: `rate`, 2·`rate`, 3·`rate`... conexiones/s, `step_seconds` cada escalón
+import asyncio
+
+from clock import loop_time
+from config import (RAMP_PROFILE, RAMP_RATE, RAMP_STEP_SECONDS, RAMP_BURST_SIZE,
+                    RAMP_INTERVAL, RAMP_KNEE_FACTOR)
+from metrics import LatencyHistogram
+
+PROFILES = ("burst", "linear", "step")
+
+
+class Ramp:
+    __slots__ = ("profile", "rate", "step_seconds", "burst_size", "interval")
+
+    def __init__(self, profile: str = RAMP_PROFILE, rate: float = RAMP_RATE,
+                 step_seconds: float = RAMP_STEP_SECONDS, burst_size: int = RAMP_BURST_SIZE,
+                 interval: float = RAMP_INTERVAL):
+        if profile not in PROFILES:
+            raise ValueError(f"Perfil de rampa desconocido: {profile}")
+        self.profile = profile
+        self.rate = rate
+        self.step_seconds = step_seconds
+        self.burst_size = burst_size
+        self.interval = interval
+
+    def offsets(self, count: int) -> list:
+        """Segundos desde el inicio en que se lanza cada una de `count` sesiones."""
+        if self.profile == "burst":
+            if self.burst_size <= 0:
+                return [0.0] * count
+            return [(i // self.burst_size) * self.interval for i in range(count)]
+        if self.profile == "linear":
+            return [i / self.rate for i in range(count)]
+        offsets, t = [], 0.0
+        for _ in range(count):
+            offsets.append(t)
+            t += 1.0 / (self.rate * (int(t // self.step_seconds) + 1))
+        return offsets
+
+    def split(self, workers: int) -> "Ramp":
+        """Parte de la rampa de cada worker: juntos suman la tasa (o el grupo) pedida."""
+        return Ramp(self.profile, self.rate / workers, self.step_seconds,
+                    -(-self.burst_size // workers) if self.burst_size > 0 else 0, self.interval)
+
+    def window(self) -> float:
+        """Ancho de ventana de la curva: un escalón en "step", un segundo en el resto."""
+        return self.step_seconds if self.profile == "step" else 1.0
+
+    def describe(self) -> str:
+        if self.profile == "linear":
+            return f"lineal {self.rate:g} conexiones/s"
+        if self.profile == "step":
+            return f"escalera +{self.rate:g} conexiones/s cada {self.step_seconds:g} s"
+        if self.burst_size <= 0:
+            return "ráfaga única"
+        return f"ráfagas de {self.burst_size} cada {self.interval:g} s"
+
+
+async def launch(sessions: list, offsets: list) -> list:
+    """Lanza `session.run()` de cada sesión en su instante; devuelve las tareas."""
+    started = loop_time()
+    tasks = []
+    for session, at in zip(sessions, offsets):
+        delay = started + at - loop_time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(session.run()))
+    return tasks
+
+
+# ------------------- CURVA RTT DE REGISTRO vs TASA -------------------
+
+def rate_curve(sessions: list, started: float, window: float) -> dict:
+    """
+    {ventana: {"connections": n, "reg": histograma}} por ventana de `window`
+    segundos desde `started`, según cuándo abrió la conexión cada sesión en
+    su primer registro (las reconexiones posteriores no son parte de la rampa).
+    """
+    curve = {}
+    for s in sessions:
+        if s.connected_at is None or s.reg_rtt is None:
+            continue
+        bucket = curve.setdefault(int((s.connected_at - started) // window),
+                                  {"connections": 0, "reg": LatencyHistogram()})
+        bucket["connections"] += 1
+        bucket["reg"].record(s.reg_rtt)
+    return curve
+
+
+def curve_to_dict(curve: dict) -> dict:
+    return {i: {"connections": b["connections"], "reg": b["reg"].to_dict()}
+            for i, b in curve.items()}
+
+
+def merge_curves(curves: list) -> dict:
+    """Fusiona las curvas (en formato dict) de varios workers."""
+    merged = {}
+    for curve in curves:
+        for i, b in curve.items():
+            bucket = merged.setdefault(int(i), {"connections": 0, "reg": LatencyHistogram()})
+            bucket["connections"] += b["connections"]
+            bucket["reg"].merge(LatencyHistogram.from_dict(b["reg"]))
+    return merged
+
+
+def find_knee(curve: dict, window: float, factor: float = RAMP_KNEE_FACTOR):
+    """
+    Mayor tasa de conexiones (por segundo) alcanzada antes de que la mediana del
+    RTT del registro supere `factor` veces la de la primera ventana; None si no se satura.
+    """
+    rows = [curve[i] for i in sorted(curve)]
+    if len(rows) < 2:
+        return None
+    baseline = rows[0]["reg"].percentile(50)
+    knee = None
+    for row in rows:
+        if row["reg"].percentile(50) > factor * baseline:
+            return knee
+        knee = max(knee or 0.0, row["connections"] / window)
+    return None
+
+
+def print_curve(curve: dict, window: float, factor: float = RAMP_KNEE_FACTOR):
+    if not curve:
+        return
+    print("   ➤ RTT del registro según la tasa de conexiones:")
+    for i in sorted(curve):
+        bucket = curve[i]
+        p50, p90, p99 = bucket["reg"].percentiles((50, 90, 99))
+        print(f"      +{i * window:>6.0f}s {bucket['connections'] / window:>8.1f} conn/s  "
+              f"p50={p50 * 1000:.1f}ms p90={p90 * 1000:.1f}ms p99={p99 * 1000:.1f}ms")
+    knee = find_knee(curve, window, factor)
+    if knee is not None:
+        print(f"   ➤ Codo del registro: ~{knee:.1f} conn/s (p50 > {factor:g}× el inicial)")
+    else:
+        print("   ➤ Codo del registro: no alcanzado")
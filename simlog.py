@@ -0,0 +1,161 @@
+# simlog.py
+# Logging estructurado de los simuladores: niveles, contexto (sn, cmd),
+# muestreo de los mensajes por trama y un hilo escritor que vuelca por lotes.
+# El loop de asyncio solo encola una tupla; el formateo y la E/S (stdout o
+# fichero) ocurren en el hilo, así un print lento no frena ws.recv().
+import atexit
+import queue
+import sys
+import threading
+import time
+
+import codec
+from config import LOG_LEVEL, LOG_FILE, LOG_FORMAT, LOG_SAMPLE_EVERY, LOG_QUEUE_SIZE
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+LEVEL_NAMES = {value: name.upper() for name, value in LEVELS.items()}
+
+FLUSH_INTERVAL = 0.05   # Espera entre lotes: agrupa escrituras bajo carga
+BATCH_MAX = 5000        # Registros como máximo por escritura
+
+_STOP = object()
+
+
+def parse_level(level) -> int:
+    """Acepta 20 o "info" / "INFO"."""
+    return level if isinstance(level, int) else LEVELS[level.lower()]
+
+
+class SimLogger:
+    """
+    Logger compartido por todas las sesiones del proceso.
+    emit() no bloquea: si la cola está llena el registro se descarta y se cuenta.
+    """
+
+    __slots__ = ("level", "path", "fmt", "sample_every", "queue", "thread",
+                 "sampled_seen", "dropped", "written")
+
+    def __init__(self, level=LOG_LEVEL, path=LOG_FILE, fmt: str = LOG_FORMAT,
+                 sample_every: int = LOG_SAMPLE_EVERY, queue_size: int = LOG_QUEUE_SIZE):
+        self.level = parse_level(level)
+        self.path = path                  # None = stdout
+        self.fmt = fmt                    # "text" o "json"
+        self.sample_every = max(1, sample_every)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.sampled_seen = 0
+        self.dropped = 0
+        self.written = 0
+
+    def enabled(self, level: int) -> bool:
+        return level >= self.level
+
+    def emit(self, level: int, msg: str, sn=None, cmd=None, sampled: bool = False, **fields):
+        """
+        Encola un registro. Con sampled=True solo pasa 1 de cada `sample_every`
+        (para los mensajes que se repiten por cada trama).
+        """
+        if level < self.level:
+            return
+        if sampled:
+            self.sampled_seen += 1
+            if (self.sampled_seen - 1) % self.sample_every:
+                return
+        if self.thread is None:
+            self.start()
+        try:
+            self.queue.put_nowait((time.time(), level, sn, cmd, msg, fields))
+        except queue.Full:
+            self.dropped += 1
+
+    def debug(self, msg, **context):
+        self.emit(DEBUG, msg, **context)
+
+    def info(self, msg, **context):
+        self.emit(INFO, msg, **context)
+
+    def warning(self, msg, **context):
+        self.emit(WARNING, msg, **context)
+
+    def error(self, msg, **context):
+        self.emit(ERROR, msg, **context)
+
+    # ------------------- HILO ESCRITOR -------------------
+
+    def start(self):
+        self.thread = threading.Thread(target=self._writer, name="simlog", daemon=True)
+        self.thread.start()
+
+    def flush(self):
+        """Detiene el hilo tras escribir todo lo pendiente (se relanza al volver a emitir)."""
+        if self.thread is None:
+            return
+        self.queue.put(_STOP)
+        self.thread.join()
+        self.thread = None
+
+    def format(self, record) -> str:
+        ts, level, sn, cmd, msg, fields = record
+        if self.fmt == "json":
+            data = {"ts": round(ts, 3), "level": LEVEL_NAMES[level].lower(), "msg": msg}
+            if sn is not None:
+                data["sn"] = sn
+            if cmd is not None:
+                data["cmd"] = cmd
+            data.update(fields)
+            return codec.dumps(data)
+
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+        parts = [f"{stamp}.{int(ts * 1000) % 1000:03d}", f"{LEVEL_NAMES[level]:<7}"]
+        if sn is not None:
+            parts.append(f"[{sn}]")
+        if cmd is not None:
+            parts.append(f"cmd={cmd}")
+        parts.append(msg)
+        parts.extend(f"{key}={value}" for key, value in fields.items())
+        return " ".join(parts)
+
+    def _writer(self):
+        out = open(self.path, "a", encoding="utf-8") if self.path else sys.stdout
+        try:
+            stop = False
+            while not stop:
+                batch = [self.queue.get()]
+                while len(batch) < BATCH_MAX:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if _STOP in batch:
+                    batch = [r for r in batch if r is not _STOP]
+                    stop = True
+                if batch:
+                    out.write("".join(self.format(r) + "\n" for r in batch))
+                    out.flush()
+                    self.written += len(batch)
+                if not stop:
+                    time.sleep(FLUSH_INTERVAL)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+
+logger = SimLogger()
+
+
+def configure(level=None, path=None, fmt: str = None, sample_every: int = None) -> SimLogger:
+    """Cambia la configuración del logger del proceso (vacía antes lo pendiente)."""
+    logger.flush()
+    if level is not None:
+        logger.level = parse_level(level)
+    if path is not None:
+        logger.path = path
+    if fmt is not None:
+        logger.fmt = fmt
+    if sample_every is not None:
+        logger.sample_every = max(1, sample_every)
+    return logger
+
+
+atexit.register(logger.flush)
@@ -0,0 +1,379 @@
+# store.py
+# Almacén en memoria de un terminal: usuarios con sus credenciales y el
+# buffer circular de logs. Todo va en arrays compactos (array / bytearray)
+# que crecen bajo demanda, para que miles de terminales quepan en RAM.
+import time
+from array import array
+
+# backupnum: 0~9 huellas, 10 contraseña, 11 tarjeta,
+# 12 = todas las huellas, 13 = usuario completo (solo en deleteuser)
+FP_BACKUPS = 10
+BACKUP_PASSWORD = 10
+BACKUP_CARD = 11
+BACKUP_ALL_FP = 12
+BACKUP_ALL = 13
+
+FP_MASK = (1 << FP_BACKUPS) - 1
+FP_TEMPLATE_LEN = 1620
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def parse_time(text: str) -> int:
+    return int(time.mktime(time.strptime(text, TIME_FORMAT)))
+
+
+def format_time(ts: int) -> str:
+    return time.strftime(TIME_FORMAT, time.localtime(ts))
+
+
+def valid_backup(backupnum, highest: int = BACKUP_CARD) -> bool:
+    """backupnum entero entre 0 y `highest` (los mensajes pueden traerlo ausente o mal tipado)."""
+    return isinstance(backupnum, int) and 0 <= backupnum <= highest
+
+
+def synthetic_record(enrollid: int, backupnum: int) -> str:
+    """Credencial generada al vuelo para usuarios sembrados (no ocupa memoria)."""
+    if backupnum == BACKUP_PASSWORD:
+        return str(10000000 + enrollid)[-8:]
+    if backupnum == BACKUP_CARD:
+        return str(2000000 + enrollid)
+    seed = f"{enrollid:08x}{backupnum:x}"
+    return (seed * (FP_TEMPLATE_LEN // len(seed) + 1))[:FP_TEMPLATE_LEN]
+
+
+class DeviceStore:
+    """Usuarios (hasta `usersize`) y logs (buffer circular de `logsize`)."""
+
+    __slots__ = ("usersize", "logsize",
+                 "_slot", "_free", "_enrollid", "_admin", "_enabled", "_mask",
+                 "_names", "_records", "_credential_counts",
+                 "_log_enrollid", "_log_time", "_log_mode", "_log_inout", "_log_event",
+                 "_log_seq", "_new_seq", "_sent_seq")
+
+    def __init__(self, usersize: int = 3000, logsize: int = 100000):
+        self.usersize = usersize
+        self.logsize = logsize
+
+        # Usuarios: un slot por usuario, arrays paralelos indexados por slot
+        self._slot = {}                 # enrollid → slot
+        self._free = []                 # slots libres para reutilizar
+        self._enrollid = array("I")
+        self._admin = bytearray()
+        self._enabled = bytearray()
+        self._mask = array("H")         # bit n = tiene credencial backupnum n
+        self._names = {}                # slot → nombre (solo si se asignó)
+        self._records = {}              # (slot << 4 | backupnum) → record explícito
+        self._credential_counts = None  # (fp, pwd, card) cacheado hasta el próximo cambio
+
+        # Logs: buffer circular; _log_seq = total de logs escritos desde el último clean
+        self._log_enrollid = array("I")
+        self._log_time = array("I")     # epoch en segundos
+        self._log_mode = bytearray()
+        self._log_inout = bytearray()
+        self._log_event = bytearray()
+        self._log_seq = 0
+        # Marca de lectura de getnewlog: los logs con secuencia >= _new_seq son "nuevos"
+        self._new_seq = 0
+        # Marca de subida por sendlog: los logs con secuencia >= _sent_seq no se han enviado
+        self._sent_seq = 0
+
+    # ------------------- USUARIOS -------------------
+
+    def user_count(self) -> int:
+        return len(self._slot)
+
+    def _new_slot(self, enrollid: int):
+        if len(self._slot) >= self.usersize:
+            return None
+        if self._free:
+            slot = self._free.pop()
+            self._enrollid[slot] = enrollid
+            self._admin[slot] = 0
+            self._enabled[slot] = 1
+            self._mask[slot] = 0
+        else:
+            slot = len(self._enrollid)
+            self._enrollid.append(enrollid)
+            self._admin.append(0)
+            self._enabled.append(1)
+            self._mask.append(0)
+        self._slot[enrollid] = slot
+        self._credential_counts = None
+        return slot
+
+    def set_credential(self, enrollid: int, backupnum: int, record=None,
+                       name: str = None, admin: int = None) -> bool:
+        """Alta o actualización de una credencial (senduser / setuserinfo)."""
+        if not isinstance(enrollid, int) or not valid_backup(backupnum):
+            return False
+        slot = self._slot.get(enrollid)
+        if slot is None:
+            slot = self._new_slot(enrollid)
+            if slot is None:
+                return False
+        self._mask[slot] |= 1 << backupnum
+        self._credential_counts = None
+        key = slot << 4 | backupnum
+        if record is None:
+            self._records.pop(key, None)
+        else:
+            self._records[key] = record
+        if name is not None:
+            self._names[slot] = name
+        if admin is not None:
+            self._admin[slot] = admin
+        return True
+
+    def get_credential(self, enrollid: int, backupnum: int):
+        """Devuelve (admin, nombre, record) o None si no existe."""
+        slot = self._slot.get(enrollid)
+        if slot is None or not valid_backup(backupnum) or not self._mask[slot] >> backupnum & 1:
+            return None
+        record = self._records.get(slot << 4 | backupnum)
+        if record is None:
+            record = synthetic_record(enrollid, backupnum)
+        return self._admin[slot], self.get_name(enrollid), record
+
+    def _drop_user(self, enrollid: int):
+        slot = self._slot.pop(enrollid)
+        for backupnum in range(BACKUP_CARD + 1):
+            self._records.pop(slot << 4 | backupnum, None)
+        self._names.pop(slot, None)
+        self._mask[slot] = 0
+        self._free.append(slot)
+        self._credential_counts = None
+
+    def delete(self, enrollid: int, backupnum: int) -> bool:
+        """deleteuser: una credencial, todas las huellas (12) o el usuario (13)."""
+        slot = self._slot.get(enrollid)
+        if slot is None or not valid_backup(backupnum, BACKUP_ALL):
+            return False
+        if backupnum == BACKUP_ALL:
+            self._drop_user(enrollid)
+            return True
+
+        bits = FP_MASK if backupnum == BACKUP_ALL_FP else 1 << backupnum
+        if not self._mask[slot] & bits:
+            return False
+        for b in range(BACKUP_CARD + 1):
+            if bits >> b & 1:
+                self._records.pop(slot << 4 | b, None)
+        self._mask[slot] &= ~bits & 0xFFFF
+        self._credential_counts = None
+        if not self._mask[slot]:
+            self._drop_user(enrollid)
+        return True
+
+    def get_name(self, enrollid: int):
+        slot = self._slot.get(enrollid)
+        if slot is None:
+            return None
+        return self._names.get(slot, f"Usuario{enrollid}")
+
+    def set_name(self, enrollid: int, name: str) -> bool:
+        slot = self._slot.get(enrollid)
+        if slot is None:
+            return False
+        self._names[slot] = name
+        return True
+
+    def set_enabled(self, enrollid: int, enabled: bool) -> bool:
+        slot = self._slot.get(enrollid)
+        if slot is None:
+            return False
+        self._enabled[slot] = 1 if enabled else 0
+        return True
+
+    def clean_users(self):
+        self._slot.clear()
+        self._free.clear()
+        self._enrollid = array("I")
+        self._admin = bytearray()
+        self._enabled = bytearray()
+        self._mask = array("H")
+        self._names.clear()
+        self._records.clear()
+        self._credential_counts = None
+
+    def clean_admins(self):
+        self._admin = bytearray(len(self._admin))
+
+    def user_entries(self) -> list:
+        """(enrollid, admin, backupnum) por credencial, ordenado (getuserlist)."""
+        entries = []
+        for enrollid in sorted(self._slot):
+            slot = self._slot[enrollid]
+            mask = self._mask[slot]
+            admin = self._admin[slot]
+            for backupnum in range(BACKUP_CARD + 1):
+                if mask >> backupnum & 1:
+                    entries.append((enrollid, admin, backupnum))
+        return entries
+
+    def seed_users(self, count: int, start: int = 1, fingerprints: int = 1,
+                   password: bool = True, card: bool = True):
+        """Siembra usuarios con credenciales sintéticas (sin guardar los records)."""
+        mask = (1 << fingerprints) - 1
+        if password:
+            mask |= 1 << BACKUP_PASSWORD
+        if card:
+            mask |= 1 << BACKUP_CARD
+        for enrollid in range(start, start + count):
+            slot = self._slot.get(enrollid)
+            if slot is None:
+                slot = self._new_slot(enrollid)
+                if slot is None:
+                    break
+            self._mask[slot] |= mask
+        self._credential_counts = None
+
+    # ------------------- LOGS -------------------
+
+    def log_count(self) -> int:
+        return min(self._log_seq, self.logsize)
+
+    def oldest_seq(self) -> int:
+        """Secuencia del log más antiguo que sigue en el buffer."""
+        return self._log_seq - self.log_count()
+
+    def next_seq(self) -> int:
+        """Secuencia que tendrá el próximo log escrito."""
+        return self._log_seq
+
+    def new_log_seq(self) -> int:
+        """Secuencia del primer log aún no entregado por getnewlog."""
+        return max(self._new_seq, self.oldest_seq())
+
+    def new_log_count(self) -> int:
+        return self._log_seq - self.new_log_seq()
+
+    def mark_new_logs_read(self, upto_seq: int):
+        """Avanza la marca de getnewlog (solo hacia delante)."""
+        if upto_seq > self._new_seq:
+            self._new_seq = min(upto_seq, self._log_seq)
+
+    def unsent_seq(self) -> int:
+        """Secuencia del primer log aún no subido por sendlog."""
+        return max(self._sent_seq, self.oldest_seq())
+
+    def unsent_count(self) -> int:
+        return self._log_seq - self.unsent_seq()
+
+    def overwritten_unsent(self) -> int:
+        """Logs sin subir que el buffer ya pisó (atraso mayor que logsize)."""
+        return max(0, self.oldest_seq() - self._sent_seq)
+
+    def mark_logs_sent(self, upto_seq: int):
+        """Avanza la marca de sendlog (solo hacia delante)."""
+        if upto_seq > self._sent_seq:
+            self._sent_seq = min(upto_seq, self._log_seq)
+
+    def append_log(self, enrollid: int, ts: int, mode: int = 0, inout: int = 0, event: int = 0):
+        if len(self._log_time) < self.logsize:
+            self._log_enrollid.append(enrollid)
+            self._log_time.append(ts)
+            self._log_mode.append(mode)
+            self._log_inout.append(inout)
+            self._log_event.append(event)
+        else:
+            pos = self._log_seq % self.logsize
+            self._log_enrollid[pos] = enrollid
+            self._log_time[pos] = ts
+            self._log_mode[pos] = mode
+            self._log_inout[pos] = inout
+            self._log_event[pos] = event
+        self._log_seq += 1
+
+    def extend_logs(self, columns: dict):
+        """
+        Añade logs en bloque desde columnas NumPy (loggen.generate_log_columns).
+        Mientras el buffer no está lleno se copian los bytes de golpe; lo que
+        no cabe entra por append_log y va pisando los más antiguos.
+        """
+        n = len(columns["time"])
+        fit = min(n, self.logsize - len(self._log_time))
+        if fit > 0:
+            self._log_enrollid.frombytes(columns["enrollid"][:fit].astype("<u4").tobytes())
+            self._log_time.frombytes(columns["time"][:fit].astype("<u4").tobytes())
+            self._log_mode.extend(columns["mode"][:fit].astype("u1").tobytes())
+            self._log_inout.extend(columns["inout"][:fit].astype("u1").tobytes())
+            self._log_event.extend(columns["event"][:fit].astype("u1").tobytes())
+            self._log_seq += fit
+        if fit < n:
+            rest = zip(*(columns[name][max(fit, 0):].tolist()
+                         for name in ("enrollid", "time", "mode", "inout", "event")))
+            for row in rest:
+                self.append_log(*row)
+
+    def append_log_record(self, record: dict):
+        self.append_log(record["enrollid"], parse_time(record["time"]), record.get("mode", 0),
+                        record.get("inout", 0), record.get("event", 0))
+
+    def log_at(self, seq: int) -> dict:
+        """Log con número de secuencia `seq` (debe seguir en el buffer)."""
+        pos = seq % self.logsize
+        return {
+            "enrollid": self._log_enrollid[pos],
+            "time": format_time(self._log_time[pos]),
+            "mode": self._log_mode[pos],
+            "inout": self._log_inout[pos],
+            "event": self._log_event[pos],
+        }
+
+    def log_range(self, start_seq: int, end_seq: int) -> list:
+        """Logs con secuencia en [start_seq, end_seq) que siguen en el buffer."""
+        start_seq = max(start_seq, self.oldest_seq())
+        end_seq = min(end_seq, self._log_seq)
+        return [self.log_at(seq) for seq in range(start_seq, end_seq)]
+
+    def clean_logs(self):
+        self._log_enrollid = array("I")
+        self._log_time = array("I")
+        self._log_mode = bytearray()
+        self._log_inout = bytearray()
+        self._log_event = bytearray()
+        self._log_seq = 0
+        self._new_seq = 0
+        self._sent_seq = 0
+
+    # ------------------- DEVINFO -------------------
+
+    def counts(self) -> dict:
+        """Contadores 'used*' de devinfo según el contenido real del almacén."""
+        if self._credential_counts is None:
+            fp = pwd = card = 0
+            for slot in self._slot.values():
+                mask = self._mask[slot]
+                fp += bin(mask & FP_MASK).count("1")
+                pwd += mask >> BACKUP_PASSWORD & 1
+                card += mask >> BACKUP_CARD & 1
+            self._credential_counts = (fp, pwd, card)
+        fp, pwd, card = self._credential_counts
+        return {"useduser": len(self._slot), "usedfp": fp, "usedcard": card,
+                "usedpwd": pwd, "usedlog": self.log_count(), "usednewlog": self.new_log_count()}
+
+
+class LogCursor:
+    """
+    Posición de un recorrido getalllog / getnewlog sobre el buffer de logs.
+    Cada paquete cuesta O(chunk): no se regenera ni se recorta la lista entera.
+    """
+
+    __slots__ = ("store", "next_seq", "sent")
+
+    def __init__(self, store: DeviceStore, start_seq: int = None):
+        self.store = store
+        self.next_seq = store.oldest_seq() if start_seq is None else start_seq
+        self.sent = 0   # registros ya enviados en este recorrido (para from/to)
+
+    def next_packet(self, chunk: int):
+        """Devuelve (from, registros) del siguiente paquete; registros vacío al terminar."""
+        # Si el buffer dio la vuelta y pisó la posición, seguimos por el más antiguo
+        self.next_seq = max(self.next_seq, self.store.oldest_seq())
+        end_seq = min(self.next_seq + chunk, self.store.next_seq())
+        records = self.store.log_range(self.next_seq, end_seq)
+        start = self.sent
+        self.next_seq = end_seq
+        self.sent += len(records)
+        return start, records
@@ -0,0 +1,106 @@
+# timerwheel.py
+# Rueda de temporizadores (hashed timing wheel, Varghese & Lauck) compartida
+# por todas las sesiones del proceso para el keepalive. El patrón de
+# ws_reg_test.py (asyncio.wait_for(ws.recv(), timeout) + ws.ping() a mano) o
+# el keepalive propio de websockets crean y cancelan un temporizador del loop
+# por conexión (y por frame en el caso de wait_for); con miles de terminales
+# el heap de temporizadores del loop crece y cada alta/baja cuesta O(log n).
+# Aquí cada sesión deja una entrada en el hueco de la rueda que le toca
+# (O(1)) y una única tarea avanza la rueda cada `tick` segundos y dispara
+# los vencidos. La precisión es de un tick, de sobra para pings de 30 s.
+import asyncio
+import math
+
+from config import WHEEL_TICK, WHEEL_SLOTS
+from simlog import ERROR, logger
+
+
+class Timer:
+    """Entrada de la rueda; `cancel()` solo la marca y se descarta al pasar por su hueco."""
+
+    __slots__ = ("rounds", "callback", "args", "cancelled")
+
+    def __init__(self, rounds: int, callback, args: tuple):
+        self.rounds = rounds            # vueltas completas que faltan antes de disparar
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerWheel:
+    """
+    `slots` huecos de `tick` segundos. La tarea que la avanza se arranca con
+    el primer schedule() y termina sola cuando no quedan temporizadores.
+    """
+
+    __slots__ = ("tick", "slots", "position", "pending", "fired", "task", "loop")
+
+    def __init__(self, tick: float = WHEEL_TICK, slots: int = WHEEL_SLOTS):
+        self.tick = tick
+        self.slots = [[] for _ in range(slots)]
+        self.position = 0
+        self.pending = 0        # temporizadores en la rueda (incluidos los cancelados)
+        self.fired = 0
+        self.task = None
+        self.loop = None
+
+    def schedule(self, delay: float, callback, *args) -> Timer:
+        """Llama a `callback(*args)` dentro de `delay` s (redondeado al tick siguiente)."""
+        ticks = max(1, math.ceil(delay / self.tick))
+        timer = Timer((ticks - 1) // len(self.slots), callback, args)
+        self.slots[(self.position + ticks) % len(self.slots)].append(timer)
+        self.pending += 1
+        self.start()
+        return timer
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        if self.task is None or self.task.done() or self.loop is not loop:
+            # Un asyncio.run() nuevo (otra prueba en el mismo proceso): la rueda vuelve a empezar
+            if self.loop is not loop and self.loop is not None:
+                self.clear()
+            self.loop = loop
+            self.task = loop.create_task(self.run())
+
+    def clear(self):
+        for slot in self.slots:
+            slot.clear()
+        self.pending = 0
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while self.pending:
+            deadline += self.tick
+            await asyncio.sleep(max(0.0, deadline - loop.time()))
+            self.advance()
+        self.task = None
+
+    def advance(self):
+        """Avanza un hueco y dispara sus temporizadores vencidos."""
+        self.position = (self.position + 1) % len(self.slots)
+        slot = self.slots[self.position]
+        if not slot:
+            return
+        # Lo que se programe desde los callbacks va a la lista nueva, no a la que se recorre
+        self.slots[self.position] = []
+        for timer in slot:
+            if timer.cancelled:
+                self.pending -= 1
+            elif timer.rounds:
+                timer.rounds -= 1
+                self.slots[self.position].append(timer)
+            else:
+                self.pending -= 1
+                self.fired += 1
+                try:
+                    timer.callback(*timer.args)
+                except Exception as ex:
+                    logger.emit(ERROR, f"❌ Error en temporizador: {ex!r}")
+
+
+# Rueda compartida por todas las sesiones del proceso
+shared_wheel = TimerWheel()
@@ -0,0 +1,129 @@
+# workload.py
+# Perfiles de carga por turnos: picos de entrada / salida, almuerzo y turnos
+# de noche. Cada perfil es una lista de eventos (hora, entrada/salida, tramo
+# de la plantilla que ficha, dispersión); de ahí salen los fichajes de cada
+# usuario de cada terminal, que ws_loadgen.py reproduce comprimidos en el tiempo.
+import math
+import random
+
+DAY = 86400
+
+
+class ShiftEvent:
+    """Fichaje masivo alrededor de `hour` (hora decimal, puede pasar de 24)."""
+
+    __slots__ = ("label", "hour", "inout", "group", "spread")
+
+    def __init__(self, label: str, hour: float, inout: int, group: tuple = (0.0, 1.0),
+                 spread: float = 4.0):
+        self.label = label
+        self.hour = hour
+        self.inout = inout      # 0 = entrada, 1 = salida
+        # Tramo [desde, hasta) de la plantilla que ficha: (0, 1/3) = el primer tercio
+        # de los enrollid; así la entrada y la salida de un turno son los mismos usuarios
+        self.group = group
+        self.spread = spread    # desviación típica en minutos
+
+    @property
+    def share(self) -> float:
+        return self.group[1] - self.group[0]
+
+    def applies(self, position: float) -> bool:
+        return self.group[0] <= position < self.group[1]
+
+    def density(self, t: float) -> float:
+        """Fichajes por segundo y por usuario en el instante `t` (segundos desde las 00:00)."""
+        sigma = self.spread * 60
+        total = 0.0
+        for day in (-1, 0, 1):
+            z = (t - (self.hour * 3600 + day * DAY)) / sigma
+            total += math.exp(-0.5 * z * z)
+        return self.share * total / (sigma * math.sqrt(2 * math.pi))
+
+
+class WorkloadProfile:
+    __slots__ = ("name", "events")
+
+    def __init__(self, name: str, events: list):
+        self.name = name
+        self.events = events
+
+    def rate(self, t: float, users: int, attendance: float = 1.0) -> float:
+        """Fichajes por segundo (tiempo simulado) de `users` usuarios en el instante `t`."""
+        return users * attendance * sum(e.density(t) for e in self.events)
+
+    def peak_and_mean(self, users: int, start: float, end: float,
+                      attendance: float = 1.0, step: float = 60.0) -> tuple:
+        """(pico, media) de fichajes/s en [start, end) muestreando cada `step` segundos."""
+        rates = [self.rate(start + i * step, users, attendance)
+                 for i in range(max(1, int((end - start) / step)))]
+        return max(rates), sum(rates) / len(rates)
+
+    def sample(self, users: int, start: float, end: float, rng: random.Random,
+               attendance: float = 0.92, user_start: int = 1) -> list:
+        """
+        Fichajes de un terminal en [start, end) (segundos desde las 00:00 del día
+        de referencia; end puede pasar de 86400 para turnos de noche).
+        Devuelve (t, enrollid, inout) ordenados por t. Cada usuario tiene su
+        costumbre (llega algo antes o después) que se mantiene entre eventos.
+        """
+        punches = []
+        first_day = math.floor(start / DAY) - 1
+        last_day = math.floor(end / DAY) + 1
+        for i in range(users):
+            enrollid = user_start + i
+            events = [e for e in self.events if e.applies(i / users)]
+            habit = rng.gauss(0.0, 1.0)
+            for day in range(first_day, last_day + 1):
+                if rng.random() >= attendance:
+                    continue
+                for event in events:
+                    sigma = event.spread * 60
+                    # Mitad costumbre del usuario, mitad ruido del día
+                    t = (event.hour * 3600 + day * DAY
+                         + sigma * (0.5 * habit + 0.866 * rng.gauss(0.0, 1.0)))
+                    if start <= t < end:
+                        punches.append((t, enrollid, event.inout))
+        punches.sort()
+        return punches
+
+
+# ------------------- PERFILES -------------------
+
+PROFILES = {
+    # Oficina: todos entran entre 08:55 y 09:05 y salen más escalonados
+    "office": WorkloadProfile("office", [
+        ShiftEvent("entrada", 9.0, 0, spread=3.0),
+        ShiftEvent("salida", 18.0, 1, spread=8.0),
+    ]),
+    # Oficina con almuerzo fichado (no todos salen a almorzar)
+    "office_lunch": WorkloadProfile("office_lunch", [
+        ShiftEvent("entrada", 9.0, 0, spread=3.0),
+        ShiftEvent("salida almuerzo", 13.0, 1, (0.0, 0.7), 6.0),
+        ShiftEvent("vuelta almuerzo", 14.0, 0, (0.0, 0.7), 4.0),
+        ShiftEvent("salida", 18.0, 1, spread=8.0),
+    ]),
+    # Turno de noche: entra a las 22:00 y sale a las 06:00 del día siguiente
+    "night": WorkloadProfile("night", [
+        ShiftEvent("entrada", 22.0, 0, spread=4.0),
+        ShiftEvent("salida", 30.0, 1, spread=6.0),
+    ]),
+    # Planta con tres turnos: un tercio de la plantilla en cada uno;
+    # en cada relevo coinciden la salida de un turno y la entrada del siguiente
+    "three_shifts": WorkloadProfile("three_shifts", [
+        ShiftEvent("entrada mañana", 6.0, 0, (0.0, 1 / 3), 3.0),
+        ShiftEvent("salida mañana", 14.0, 1, (0.0, 1 / 3), 4.0),
+        ShiftEvent("entrada tarde", 14.0, 0, (1 / 3, 2 / 3), 3.0),
+        ShiftEvent("salida tarde", 22.0, 1, (1 / 3, 2 / 3), 4.0),
+        ShiftEvent("entrada noche", 22.0, 0, (2 / 3, 1.0), 3.0),
+        ShiftEvent("salida noche", 30.0, 1, (2 / 3, 1.0), 4.0),
+    ]),
+}
+
+
+def parse_hour(text: str) -> float:
+    """"08:30" → 8.5; "30:00" = 06:00 del día siguiente; también acepta "8.5"."""
+    if ":" in text:
+        hours, minutes = text.split(":", 1)
+        return int(hours) + int(minutes) / 60
+    return float(text)
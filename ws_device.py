@@ -0,0 +1,29 @@
+import asyncio
+
+from config import WS_URL, FAULTS
+from device import DeviceSession
+from faults import FaultPolicy
+
+# ------------------- CONFIGURACIÓN -------------------
+DEVICE_SN = "ZX0006827500"
+# 👈 Fallos por comando (formato de faults.py; None = los de config.FAULTS), p. ej.
+# {"*": {"error": 1.0}} para responder result:false a todo, o
+# {"*": {"error": 0.1, "reasons": [1, 2]}, "getnewlog": {"drop": 0.2}}
+FALLOS = None
+
+# -------------------------------------------------
+# Terminal simulado que atiende todos los comandos del servidor
+# (getalllog, getnewlog, getuserlist, setuserinfo, opendoor, reboot, ...)
+# usando el motor de commands.py.
+# -------------------------------------------------
+
+async def run():
+    spec = FAULTS if FALLOS is None else FALLOS
+    faults = FaultPolicy.from_dict(spec) if spec is not None else None
+    device = DeviceSession(DEVICE_SN, url=WS_URL, faults=faults)
+    print("\n⏳ Esperando comandos del servidor (Ctrl+C para salir)...")
+    await device.run()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,346 @@
+import asyncio
+import argparse
+import math
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import clock
+from config import (WS_URL, FLEET_SN_PREFIX, FLEET_SN_START, FLEET_DEVICES,
+                    FAULTS, FAULT_SHARE, FAULT_SEED, MAX_HANDSHAKES, KEEPALIVE)
+from device import KEEPALIVE_MODES, DeviceSession, wait_registered
+from faults import FaultPolicy, load_policy, pick_faulty
+from metrics import LatencyHistogram, report_periodically, write_latency_report
+from ramp import (PROFILES as RAMP_PROFILES, Ramp, curve_to_dict, launch, merge_curves,
+                  print_curve, rate_curve)
+from simlog import configure, logger
+
+# ------------------- CONFIGURACIÓN -------------------
+SETTLE_SECONDS = 5     # Espera tras conectar todos antes de medir memoria
+DURATION = 0           # Segundos que vive la flota (0 = hasta Ctrl+C)
+
+# ------------------- FUNCIONES -------------------
+
+def sn_range(prefix: str = FLEET_SN_PREFIX, start: int = FLEET_SN_START,
+             count: int = FLEET_DEVICES, width: int = 10) -> list:
+    """Genera números de serie consecutivos: ZX0006827500, ZX0006827501, ..."""
+    return [f"{prefix}{n:0{width}d}" for n in range(start, start + count)]
+
+
+def rss_bytes() -> int:
+    """Memoria residente actual del proceso (Linux: /proc; otros: pico de ru_maxrss)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+async def run_fleet(sns: list, url: str = WS_URL, duration: float = DURATION,
+                    settle: float = SETTLE_SECONDS, verbose: bool = False,
+                    report_every: float = 0, faults: FaultPolicy = None,
+                    faulty: set = None, reconnect: bool = True, ramp: Ramp = None,
+                    max_handshakes: int = MAX_HANDSHAKES, keepalive: str = KEEPALIVE,
+                    fault_seed: int = FAULT_SEED) -> dict:
+    """
+    Ejecuta una sesión por SN como tareas del mismo loop y devuelve el reporte.
+    `faults` se aplica a los SN de `faulty` (None = a todos), sorteada con
+    `fault_seed` y el SN; las sesiones se lanzan según `ramp` con como mucho
+    `max_handshakes` registros en curso.
+    """
+    ramp = Ramp() if ramp is None else ramp
+    handshakes = asyncio.Semaphore(max_handshakes) if max_handshakes else None
+    stats = Counter()
+    latency = {}
+    timeline = Counter()
+    reporter = None
+    if report_every:
+        reporter = asyncio.create_task(report_periodically(latency, report_every,
+                                                           f"flota pid={os.getpid()}"))
+    base_rss = rss_bytes()
+    sessions = [DeviceSession(sn, url=url, stats=stats, latency=latency, verbose=verbose,
+                              faults=faults if faulty is None or sn in faulty else None,
+                              reconnect=reconnect, timeline=timeline, handshakes=handshakes,
+                              keepalive=keepalive, fault_seed=fault_seed)
+                for sn in sns]
+
+    started = time.perf_counter()
+    loop_started = asyncio.get_running_loop().time()
+    tasks = await launch(sessions, ramp.offsets(len(sessions)))
+
+    # Esperar a que todas las sesiones se registren (o fallen su primer intento)
+    await wait_registered(sessions, tasks)
+    ramp_seconds = time.perf_counter() - started
+
+    await asyncio.sleep(settle)
+    steady_rss = rss_bytes()
+
+    # CPU en régimen (conexiones abiertas, keepalive y comandos), sin la rampa
+    cpu_started = time.process_time()
+    steady_started = time.perf_counter()
+    if duration:
+        await asyncio.sleep(duration)
+    else:
+        await asyncio.gather(*tasks, return_exceptions=True)
+    cpu_seconds = time.process_time() - cpu_started
+    steady_seconds = time.perf_counter() - steady_started
+
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if reporter is not None:
+        reporter.cancel()
+
+    # Primer registro de cada sesión: las reconexiones no alargan la rampa
+    registered = [s.registered_at - loop_started for s in sessions if s.registered_at]
+    report = dict(stats)
+    report["devices"] = len(sessions)
+    report["faulty_devices"] = sum(s.faults is not None for s in sessions)
+    report["ramp_seconds"] = ramp_seconds
+    report["conn_per_sec"] = len(registered) / max(registered) if registered else 0.0
+    report["rss_bytes"] = steady_rss
+    report["bytes_per_device"] = (steady_rss - base_rss) / max(len(sessions), 1)
+    report["cpu_seconds"] = cpu_seconds
+    report["steady_seconds"] = steady_seconds
+    report["keepalive"] = keepalive
+    report["latency"] = {name: h.to_dict() for name, h in latency.items()}
+    report["timeline"] = dict(timeline)
+    report["ramp_window"] = ramp.window()
+    report["ramp_curve"] = curve_to_dict(rate_curve(sessions, loop_started, ramp.window()))
+    return report
+
+
+# ------------------- MULTIPROCESO -------------------
+
+def shard(sns: list, workers: int) -> list:
+    """Reparte el rango de SN en `workers` bloques contiguos."""
+    size, extra = divmod(len(sns), workers)
+    shards, pos = [], 0
+    for i in range(workers):
+        end = pos + size + (1 if i < extra else 0)
+        if end > pos:
+            shards.append(sns[pos:end])
+        pos = end
+    return shards
+
+
+def _run_shard(sns, url, duration, settle, verbose, log_options, report_every, clock_options,
+               faults, faulty, reconnect, ramp, max_handshakes, keepalive, fault_seed):
+    """Punto de entrada de cada worker: su propio loop con su porción de la flota."""
+    configure(**log_options)
+    clock.configure(**clock_options)
+    try:
+        report = asyncio.run(run_fleet(sns, url=url, duration=duration, settle=settle,
+                                       verbose=verbose, report_every=report_every,
+                                       faults=faults, faulty=faulty, reconnect=reconnect,
+                                       ramp=ramp, max_handshakes=max_handshakes,
+                                       keepalive=keepalive, fault_seed=fault_seed))
+    finally:
+        # Los workers terminan sin atexit: se vacía el log a mano
+        logger.flush()
+    report["pid"] = os.getpid()
+    report["log_dropped"] = logger.dropped
+    return report
+
+
+def merge_reports(reports: list) -> dict:
+    """Suma contadores y fusiona histogramas de todos los workers."""
+    merged = Counter()
+    latency = {}
+    timeline = Counter()
+    for r in reports:
+        for key, value in r.items():
+            if key in ("latency", "timeline", "pid", "ramp_seconds", "ramp_window", "ramp_curve",
+                       "steady_seconds", "keepalive"):
+                continue
+            merged[key] += value
+        # loop.time() es el reloj monótono del sistema: los segundos coinciden entre procesos
+        timeline.update(r.get("timeline", {}))
+        for name, data in r.get("latency", {}).items():
+            latency.setdefault(name, LatencyHistogram()).merge(LatencyHistogram.from_dict(data))
+
+    report = dict(merged)
+    report["workers"] = len(reports)
+    report["ramp_seconds"] = max((r["ramp_seconds"] for r in reports), default=0.0)
+    report["steady_seconds"] = max((r["steady_seconds"] for r in reports), default=0.0)
+    report["keepalive"] = reports[0]["keepalive"] if reports else KEEPALIVE
+    # conn_per_sec y rss ya se sumaron; bytes_per_device se recalcula sobre el total
+    report["bytes_per_device"] = (sum(r["bytes_per_device"] * r["devices"] for r in reports)
+                                  / max(report.get("devices", 0), 1))
+    report["latency"] = {name: h.to_dict() for name, h in latency.items()}
+    report["timeline"] = dict(timeline)
+    report["ramp_window"] = reports[0]["ramp_window"] if reports else 1.0
+    report["ramp_curve"] = curve_to_dict(merge_curves([r["ramp_curve"] for r in reports]))
+    return report
+
+
+def run_sharded(sns: list, workers: int, url: str = WS_URL, duration: float = DURATION,
+                settle: float = SETTLE_SECONDS, verbose: bool = False,
+                log_options: dict = None, report_every: float = 0,
+                clock_options: dict = None, faults: FaultPolicy = None,
+                faulty: set = None, reconnect: bool = True, ramp: Ramp = None,
+                max_handshakes: int = MAX_HANDSHAKES, keepalive: str = KEEPALIVE,
+                fault_seed: int = FAULT_SEED) -> dict:
+    """
+    Ejecuta la flota repartida en un pool de procesos (un loop por worker).
+    Cada worker hace su parte de la rampa y del tope de handshakes.
+    """
+    shards = shard(sns, workers)
+    ramp = (Ramp() if ramp is None else ramp).split(len(shards))
+    max_handshakes = -(-max_handshakes // len(shards))
+    with ProcessPoolExecutor(max_workers=len(shards)) as pool:
+        futures = [pool.submit(_run_shard, s, url, duration, settle, verbose,
+                               log_options or {}, report_every, clock_options or {},
+                               faults, faulty & set(s) if faulty is not None else None,
+                               reconnect, ramp, max_handshakes, keepalive, fault_seed)
+                   for s in shards]
+        return merge_reports([f.result() for f in futures])
+
+
+def print_report(report: dict):
+    print("\n📊 Reporte de la flota")
+    print(f"   ➤ Dispositivos:            {report['devices']}")
+    print(f"   ➤ Conectados / registrados: {report.get('connected', 0)} / {report.get('registered', 0)}")
+    print(f"   ➤ Registros sin respuesta / rechazados: "
+          f"{report.get('reg_timeout', 0)} / {report.get('reg_rejected', 0)}")
+    print(f"   ➤ Errores / cierres:        {report.get('errors', 0)} / {report.get('closed', 0)}")
+    print(f"   ➤ Frames in / out:          {report.get('frames_in', 0)} / {report.get('frames_out', 0)}")
+    print(f"   ➤ Conexiones por segundo:   {report['conn_per_sec']:.1f}")
+    print(f"   ➤ Memoria por dispositivo:  {report['bytes_per_device'] / 1024:.1f} KiB "
+          f"(RSS total {report['rss_bytes'] / 2**20:.1f} MiB)")
+    if report.get("steady_seconds"):
+        per_device = report["cpu_seconds"] / report["steady_seconds"] / max(report["devices"], 1)
+        print(f"   ➤ CPU en régimen:           {report['cpu_seconds']:.2f} s en "
+              f"{report['steady_seconds']:.0f} s ({per_device * 1e6:.1f} µs/s por dispositivo)")
+    print(f"   ➤ Keepalive:                {report.get('keepalive')}, pings {report.get('pings', 0)}"
+          f" / pongs {report.get('pongs', 0)} / inactivas {report.get('idle_timeouts', 0)}")
+    if report.get("faulty_devices"):
+        injected = {key[6:]: value for key, value in report.items() if key.startswith("fault_")}
+        print(f"   ➤ Terminales con fallos:    {report['faulty_devices']} "
+              f"({', '.join(f'{k}={v}' for k, v in sorted(injected.items())) or 'sin fallos aún'})")
+    if report.get("workers"):
+        print(f"   ➤ Workers:                 {report['workers']}")
+    if report.get("log_dropped"):
+        print(f"   ➤ Logs descartados:         {report['log_dropped']}")
+    if report.get("reconnect_attempts"):
+        print(f"   ➤ Reconexiones / intentos:  {report.get('reconnected', 0)} / "
+              f"{report['reconnect_attempts']}")
+    for name, data in sorted(report.get("latency", {}).items()):
+        print(f"   ➤ Latencia {name}: {LatencyHistogram.from_dict(data).summary()}")
+    print_timeline(report.get("timeline", {}))
+    if report.get("ramp_curve"):
+        print_curve(merge_curves([report["ramp_curve"]]), report["ramp_window"])
+
+
+def print_timeline(timeline: dict, rows: int = 20, width: int = 40):
+    """Intentos de conexión por segundo (rampa inicial y tormentas de reconexión)."""
+    if len(timeline) < 2:
+        return
+    first = min(timeline)
+    step = max(1, math.ceil((max(timeline) - first + 1) / rows))
+    buckets = Counter()
+    for second, attempts in timeline.items():
+        buckets[(second - first) // step] += attempts
+    peak = max(buckets.values())
+    print(f"   ➤ Intentos de conexión por segundo (pico {max(timeline.values())}/s):")
+    for i in range(max(buckets) + 1):
+        bar = "█" * math.ceil(width * buckets[i] / peak)
+        print(f"      +{i * step:>5}s {bar:<{width}} {buckets[i] / step:.0f}/s")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Flota de terminales simulados en un solo loop")
+    parser.add_argument("--url", default=WS_URL)
+    parser.add_argument("--prefix", default=FLEET_SN_PREFIX)
+    parser.add_argument("--start", type=int, default=FLEET_SN_START)
+    parser.add_argument("--count", type=int, default=FLEET_DEVICES)
+    parser.add_argument("--duration", type=float, default=DURATION)
+    parser.add_argument("--settle", type=float, default=SETTLE_SECONDS)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="procesos en los que repartir la flota (0 = todos los núcleos)")
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--log-level", help="debug / info / warning / error")
+    parser.add_argument("--log-file", help="fichero de log (por defecto stdout)")
+    parser.add_argument("--log-format", choices=("text", "json"))
+    parser.add_argument("--log-sample", type=int,
+                        help="escribir 1 de cada N mensajes por trama")
+    parser.add_argument("--report-every", type=float, default=0,
+                        help="segundos entre volcados de percentiles al log (0 = solo al final)")
+    parser.add_argument("--latency-out", help="JSON con percentiles e histogramas al terminar")
+    parser.add_argument("--speedup", type=float,
+                        help="factor del reloj virtual de los terminales (clock.py)")
+    parser.add_argument("--clock-start", help="hora simulada inicial, YYYY-MM-DD HH:MM:SS")
+    parser.add_argument("--ramp", choices=RAMP_PROFILES,
+                        help="perfil de arranque de ramp.py (por defecto config.RAMP_PROFILE)")
+    parser.add_argument("--ramp-rate", type=float,
+                        help="conexiones/s (linear) o incremento por escalón (step)")
+    parser.add_argument("--step-seconds", type=float, help="duración de cada escalón")
+    parser.add_argument("--burst-size", type=int, help="sesiones por ráfaga (0 = todas)")
+    parser.add_argument("--burst-interval", type=float, help="segundos entre ráfagas")
+    parser.add_argument("--max-handshakes", type=int, default=MAX_HANDSHAKES,
+                        help="connect + registro simultáneos como máximo (0 = sin tope)")
+    parser.add_argument("--keepalive", choices=KEEPALIVE_MODES, default=KEEPALIVE,
+                        help="pings: rueda compartida, tarea por conexión, websockets o sin pings")
+    parser.add_argument("--no-reconnect", action="store_true",
+                        help="no reconectar si se cae la conexión")
+    parser.add_argument("--faults", help="política de fallos de faults.py: fichero o JSON")
+    parser.add_argument("--fault-share", type=float, default=FAULT_SHARE,
+                        help="parte de la flota con fallos (0.02 = el 2 %%)")
+    parser.add_argument("--fault-seed", type=int, default=FAULT_SEED,
+                        help="semilla para elegir los terminales con fallos y sortear sus fallos")
+    return parser.parse_args()
+
+
+def run(args):
+    sns = sn_range(args.prefix, args.start, args.count)
+    workers = args.workers or os.cpu_count() or 1
+    log_options = {"level": args.log_level, "path": args.log_file,
+                   "fmt": args.log_format, "sample_every": args.log_sample}
+    configure(**log_options)
+    # Hora de inicio común a todos los workers
+    clock_options = {"speedup": args.speedup,
+                     "start": clock.parse_start(args.clock_start)
+                     if args.clock_start or args.speedup else None}
+    clock.configure(**clock_options)
+    if args.faults:
+        faults = load_policy(args.faults)
+    else:
+        faults = FaultPolicy.from_dict(FAULTS) if FAULTS is not None else None
+    faulty = pick_faulty(sns, args.fault_share, args.fault_seed) if faults is not None else None
+    ramp = Ramp(**{key: value for key, value in (
+        ("profile", args.ramp), ("rate", args.ramp_rate), ("step_seconds", args.step_seconds),
+        ("burst_size", args.burst_size), ("interval", args.burst_interval)) if value is not None})
+    print(f"🚀 Lanzando {len(sns)} terminales ({sns[0]} … {sns[-1]}) contra {args.url}"
+          f" en {workers} proceso(s), arranque: {ramp.describe()}")
+    if workers > 1:
+        report = run_sharded(sns, workers, url=args.url, duration=args.duration,
+                             settle=args.settle, verbose=args.verbose, log_options=log_options,
+                             report_every=args.report_every, clock_options=clock_options,
+                             faults=faults, faulty=faulty, reconnect=not args.no_reconnect,
+                             ramp=ramp, max_handshakes=args.max_handshakes,
+                             keepalive=args.keepalive, fault_seed=args.fault_seed)
+    else:
+        report = asyncio.run(run_fleet(sns, url=args.url, duration=args.duration,
+                                       settle=args.settle, verbose=args.verbose,
+                                       report_every=args.report_every,
+                                       faults=faults, faulty=faulty,
+                                       reconnect=not args.no_reconnect,
+                                       ramp=ramp, max_handshakes=args.max_handshakes,
+                                       keepalive=args.keepalive, fault_seed=args.fault_seed))
+        logger.flush()
+        report["log_dropped"] = logger.dropped
+    print_report(report)
+    if args.latency_out:
+        latency = {name: LatencyHistogram.from_dict(data)
+                   for name, data in report["latency"].items()}
+        write_latency_report(args.latency_out, latency, devices=report["devices"])
+
+
+# ------------------- EJECUCIÓN -------------------
+if __name__ == "__main__":
+    try:
+        run(parse_args())
+    except KeyboardInterrupt:
+        print("\n🛑 Flota detenida.")
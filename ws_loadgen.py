@@ -0,0 +1,360 @@
+import asyncio
+import argparse
+import random
+import time
+from collections import Counter
+from datetime import datetime
+from functools import partial
+
+import websockets
+
+import clock
+from clock import loop_time
+from batching import print_summary, summarize
+from config import (WS_URL, TIMEOUT_SECONDS, FLEET_SN_PREFIX, FLEET_SN_START, FLEET_DEVICES,
+                    FLUSH_BATCH_SIZE)
+from device import DeviceSession, wait_registered
+from metrics import observe, write_latency_report
+from simlog import configure, logger
+from workload import PROFILES, parse_hour
+from ws_fleet import sn_range
+
+# ------------------- CONFIGURACIÓN -------------------
+TARGET_RATE = 1000              # Registros por segundo entre toda la flota
+BATCH_SIZE = 20                 # Registros por sendlog (mínimo)
+BATCH_MAX = None                # Máximo (tamaño uniforme entre ambos); None = fijo
+DURATION = 30                   # Segundos de carga
+DRAIN_SECONDS = TIMEOUT_SECONDS # Espera final por los ret sendlog pendientes
+
+# Reproducción de perfiles de turnos (workload.py)
+PROFILE_USERS = 1000            # Usuarios que fichan en cada terminal
+PROFILE_FROM = "08:30"          # Tramo del día simulado a reproducir
+PROFILE_TO = "09:30"
+SPEEDUP = 60                    # Segundos simulados por segundo real
+ATTENDANCE = 0.92
+
+# Modo atraso (--backlog): cada terminal arranca con registros sin subir
+BACKLOG = 5000                  # Registros pendientes por terminal
+
+# -------------------------------------------------
+# Generador de carga sendlog de lazo abierto: los envíos siguen un
+# calendario de llegadas de Poisson fijado de antemano y no esperan el
+# ret anterior, así una ralentización del servidor se ve como latencia
+# (medida desde el instante planificado) y no como menos carga.
+# El calendario sale de una tasa constante o de un perfil de turnos
+# (--profile) comprimido en el tiempo: cada fichaje es un sendlog de 1
+# registro, como lo empuja un terminal real al marcar.
+# Con --backlog cada terminal arranca con un atraso de fichajes y lo vacía
+# al registrarse (lote fijo o adaptativo con --adaptive): mide cuánto tarda
+# el servidor en absorberlo y a qué tamaño de lote converge.
+# -------------------------------------------------
+
+def poisson_arrivals(rate: float, duration: float, rng: random.Random):
+    """Instantes (segundos desde el inicio) de un proceso de Poisson de tasa `rate`."""
+    at = rng.expovariate(rate)
+    while at < duration:
+        yield at
+        at += rng.expovariate(rate)
+
+
+def rate_schedule(sessions: list, rate: float, batch: int, batch_max: int,
+                  duration: float, rng: random.Random):
+    """(instante, sesión, fábrica de records) a `rate` registros/s repartidos al azar."""
+    batch_max = max(batch, batch_max or batch)
+    arrivals_per_sec = rate / ((batch + batch_max) / 2)
+    for at in poisson_arrivals(arrivals_per_sec, duration, rng):
+        session = rng.choice(sessions)
+        yield at, session, partial(session.punch, rng.randint(batch, batch_max))
+
+
+def profile_schedule(sessions: list, profile, users: int, start: float, end: float,
+                     speedup: float, rng: random.Random, attendance: float = ATTENDANCE,
+                     day: datetime = None) -> list:
+    """
+    Fichajes del perfil en [start, end) (segundos del día simulado) de todos los
+    terminales, comprimidos `speedup` veces. La hora de cada record es la simulada.
+    """
+    day = day or datetime.now()
+    midnight = int(time.mktime(day.replace(hour=0, minute=0, second=0,
+                                           microsecond=0).timetuple()))
+    punches = []
+    for idx, session in enumerate(sessions):
+        punches.extend((t, idx, enrollid, inout)
+                       for t, enrollid, inout in profile.sample(users, start, end, rng, attendance))
+    punches.sort()
+    # Se construye entero antes de arrancar: muestrear no debe retrasar el primer envío
+    return [((t - start) / speedup, sessions[idx],
+             partial(_single_punch, sessions[idx], enrollid, midnight + int(t), inout))
+            for t, idx, enrollid, inout in punches]
+
+
+def _single_punch(session: DeviceSession, enrollid: int, ts: int, inout: int) -> list:
+    return [session.punch_one(enrollid, ts, inout)]
+
+
+async def _send(session: DeviceSession, make_records, intended: float, stats: Counter):
+    try:
+        await session.send_logs(make_records(), intended)
+    except websockets.ConnectionClosed:
+        stats["sendlog_send_errors"] += 1
+
+
+async def drive_sendlog(schedule, stats: Counter, latency: dict) -> float:
+    """
+    Ejecuta un calendario (instante, sesión, fábrica de records) sin esperar los
+    ret. Los fichajes de un terminal caído se marcan igual: quedan en su buffer
+    y suben al reconectar (send_logs). Devuelve el tiempo real que llevó emitirlo.
+    """
+    sends = set()
+    per_second = Counter()
+    started = loop_time()
+
+    for at, session, make_records in schedule:
+        intended = started + at
+        delay = intended - loop_time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            # Retraso del propio generador: si crece, el cliente es el cuello de botella
+            observe(latency, "lag:loadgen", -delay)
+        per_second[int(loop_time() - started)] += 1
+        task = asyncio.create_task(_send(session, make_records, intended, stats))
+        sends.add(task)
+        task.add_done_callback(sends.discard)
+
+    elapsed = loop_time() - started
+    stats["peak_sendlog_per_sec"] = max(per_second.values(), default=0)
+    if sends:
+        await asyncio.gather(*sends)
+    return elapsed
+
+
+def outstanding(sessions: list) -> int:
+    return sum(len(s.pending.get("sendlog", ())) for s in sessions)
+
+
+def unflushed(sessions: list) -> int:
+    """Fichajes aún en el buffer de los terminales (sin conexión o esperando su lote)."""
+    return sum(s.store.unsent_count() + sum(len(r) for r, _ in s.rejected) for s in sessions)
+
+
+async def run_load(sns: list, url: str = WS_URL, rate: float = TARGET_RATE,
+                   batch: int = BATCH_SIZE, batch_max: int = BATCH_MAX,
+                   duration: float = DURATION, seed=None, profile=None,
+                   users: int = PROFILE_USERS, start: float = None, end: float = None,
+                   speedup: float = SPEEDUP) -> dict:
+    stats = Counter()
+    latency = {}
+    sessions = [DeviceSession(sn, url=url, stats=stats, latency=latency, verbose=False)
+                for sn in sns]
+    tasks = [asyncio.create_task(s.run()) for s in sessions]
+    await wait_registered(sessions, tasks)
+
+    rng = random.Random(seed)
+    live = [s for s in sessions if s.ws is not None and s.registered_at]
+    if not live:
+        schedule = ()
+    elif profile is not None:
+        day = clock.shared_clock.datetime()
+        schedule = profile_schedule(live, profile, users, start, end, speedup, rng, day=day)
+        # El reloj virtual arranca en el inicio del tramo y avanza al mismo ritmo que el
+        # calendario: registros, settime y esperas simuladas ven la misma hora
+        midnight = day.replace(hour=0, minute=0, second=0, microsecond=0)
+        clock.configure(speedup, midnight.timestamp() + start)
+    else:
+        schedule = rate_schedule(live, rate, batch, batch_max, duration, rng)
+    elapsed = await drive_sendlog(schedule, stats, latency)
+    # El calendario cubre toda la ventana aunque el último envío llegue antes del final
+    window = (end - start) / speedup if profile is not None else duration
+    elapsed = max(elapsed, window)
+
+    deadline = loop_time() + DRAIN_SECONDS
+    while (outstanding(sessions) or unflushed(sessions)) and loop_time() < deadline:
+        await asyncio.sleep(0.05)
+    lost = outstanding(sessions)
+    left = unflushed(sessions)
+
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    report = dict(stats)
+    acked = stats["sendlog_ok"] + stats["sendlog_failed"]
+    report.update({
+        "devices": len(sessions),
+        "target_rate": rate,
+        "elapsed": elapsed,
+        "achieved_rate": stats["sendlog_records"] / elapsed if elapsed else 0.0,
+        "ack_rate": acked / elapsed if elapsed else 0.0,
+        "error_rate": stats["sendlog_failed"] / acked if acked else 0.0,
+        "sendlog_lost": lost,
+        "sendlog_unflushed": left,
+        "latency": latency,
+    })
+    return report
+
+
+async def run_backlog(sns: list, url: str = WS_URL, backlog: int = BACKLOG,
+                      adaptive: bool = True, flush_batch: int = FLUSH_BATCH_SIZE,
+                      flush_rate: float = 0, duration: float = DURATION) -> dict:
+    stats = Counter()
+    latency = {}
+    sessions = [DeviceSession(sn, url=url, stats=stats, latency=latency, verbose=False,
+                              flush_batch=flush_batch, flush_rate=flush_rate, adaptive=adaptive)
+                for sn in sns]
+    for s in sessions:
+        for _ in range(backlog):
+            s.punch_one(s.rng.randint(1, max(s.store.user_count(), 1)), int(s.clock.now()))
+
+    started = loop_time()
+    tasks = [asyncio.create_task(s.run()) for s in sessions]
+    deadline = started + duration
+    while loop_time() < deadline and any(
+            s.registered_at is None or s.store.unsent_count() or s.rejected
+            or s.pending.get("sendlog")
+            for s in sessions):
+        await asyncio.sleep(0.1)
+    elapsed = loop_time() - started
+
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    report = dict(stats)
+    report.update({
+        "devices": len(sessions),
+        "backlog": backlog * len(sessions),
+        "backlog_left": unflushed(sessions) + stats["sendlog_lost_records"],
+        "elapsed": elapsed,
+        "throughput": stats["sendlog_records"] / elapsed if elapsed else 0.0,
+        "batching": summarize([s.batcher for s in sessions]) if adaptive else None,
+        "latency": latency,
+    })
+    return report
+
+
+def print_backlog_report(report: dict):
+    print("\n📊 Reporte de vaciado de atraso")
+    print(f"   ➤ Dispositivos registrados: {report.get('registered', 0)} / {report['devices']}")
+    print(f"   ➤ Atraso subido:            {report['backlog'] - report['backlog_left']} / "
+          f"{report['backlog']} registros en {report['elapsed']:.1f} s "
+          f"({report['throughput']:.1f} registros/s)")
+    print(f"   ➤ sendlog enviados / ret:   {report.get('sendlog_sent', 0)} / "
+          f"{report.get('sendlog_ok', 0) + report.get('sendlog_failed', 0)} "
+          f"(result false {report.get('sendlog_failed', 0)}, "
+          f"timeouts {report.get('sendlog_ack_timeout', 0)})")
+    if report.get("flush_retried_records") or report.get("sendlog_lost_records"):
+        print(f"   ➤ Rechazados:               {report.get('flush_retried_records', 0)} "
+              f"registros reenviados, {report.get('sendlog_lost_records', 0)} perdidos")
+    if report["batching"] is not None:
+        print_summary(report["batching"])
+    for name, hist in sorted(report["latency"].items()):
+        print(f"   ➤ Latencia {name}: {hist.summary()}")
+
+
+def print_report(report: dict):
+    print("\n📊 Reporte de carga sendlog")
+    print(f"   ➤ Dispositivos registrados: {report.get('registered', 0)} / {report['devices']}")
+    print(f"   ➤ Tasa objetivo:            {report['target_rate']:.1f} registros/s")
+    print(f"   ➤ Tasa lograda:             {report['achieved_rate']:.1f} registros/s "
+          f"({report.get('sendlog_records', 0)} registros en {report['elapsed']:.1f} s)")
+    print(f"   ➤ Pico (1 s):               {report.get('peak_sendlog_per_sec', 0)} sendlog/s")
+    print(f"   ➤ sendlog enviados / ret:   {report.get('sendlog_sent', 0)} / "
+          f"{report.get('sendlog_ok', 0) + report.get('sendlog_failed', 0)} "
+          f"({report['ack_rate']:.1f} ret/s)")
+    print(f"   ➤ Errores (result false):   {report.get('sendlog_failed', 0)} "
+          f"({report['error_rate'] * 100:.2f} %)")
+    print(f"   ➤ Sin ret / envío fallido:  {report['sendlog_lost']} / "
+          f"{report.get('sendlog_send_errors', 0)}")
+    print(f"   ➤ Fichajes al buffer:       {report.get('sendlog_buffered', 0)} registros, "
+          f"{report.get('flush_records', 0)} subidos después, "
+          f"{report['sendlog_unflushed']} sin subir")
+    for name, hist in sorted(report["latency"].items()):
+        print(f"   ➤ Latencia {name}: {hist.summary()}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Carga sendlog de lazo abierto (llegadas de Poisson)")
+    parser.add_argument("--url", default=WS_URL)
+    parser.add_argument("--prefix", default=FLEET_SN_PREFIX)
+    parser.add_argument("--start", type=int, default=FLEET_SN_START)
+    parser.add_argument("--count", type=int, default=FLEET_DEVICES)
+    parser.add_argument("--rate", type=float, default=TARGET_RATE, help="registros por segundo")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="registros por sendlog")
+    parser.add_argument("--batch-max", type=int, default=BATCH_MAX,
+                        help="tamaño máximo (uniforme entre --batch y --batch-max)")
+    parser.add_argument("--duration", type=float, default=DURATION)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--profile", choices=sorted(PROFILES),
+                        help="reproducir un perfil de turnos en lugar de una tasa constante")
+    parser.add_argument("--users", type=int, default=PROFILE_USERS,
+                        help="usuarios por terminal (con --profile)")
+    parser.add_argument("--from", dest="from_hour", default=PROFILE_FROM,
+                        help="inicio del tramo simulado, p. ej. 08:30 (con --profile)")
+    parser.add_argument("--to", dest="to_hour", default=PROFILE_TO,
+                        help="fin del tramo simulado; 30:00 = 06:00 del día siguiente")
+    parser.add_argument("--speedup", type=float, default=SPEEDUP,
+                        help="segundos simulados por segundo real (con --profile)")
+    parser.add_argument("--backlog", type=int, nargs="?", const=BACKLOG,
+                        help="modo atraso: registros sin subir por terminal al arrancar")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="lote AIMD de batching.py al vaciar el atraso")
+    parser.add_argument("--flush-batch", type=int, default=FLUSH_BATCH_SIZE,
+                        help="lote fijo (o inicial con --adaptive) al vaciar el atraso")
+    parser.add_argument("--flush-rate", type=float, default=0,
+                        help="tope de registros/s por terminal al vaciar el atraso (0 = sin tope)")
+    parser.add_argument("--latency-out", help="JSON con percentiles e histogramas al terminar")
+    parser.add_argument("--log-level", help="debug / info / warning / error")
+    return parser.parse_args()
+
+
+def run(args):
+    configure(level=args.log_level)
+    sns = sn_range(args.prefix, args.start, args.count)
+    if args.backlog:
+        mode = "adaptativo" if args.adaptive else f"fijo de {args.flush_batch}"
+        print(f"🚀 {len(sns)} terminales con {args.backlog} registros sin subir cada uno, "
+              f"lote {mode}, contra {args.url}")
+        report = asyncio.run(run_backlog(sns, url=args.url, backlog=args.backlog,
+                                         adaptive=args.adaptive, flush_batch=args.flush_batch,
+                                         flush_rate=args.flush_rate, duration=args.duration))
+        logger.flush()
+        print_backlog_report(report)
+        if args.latency_out:
+            write_latency_report(args.latency_out, report["latency"],
+                                 throughput=report["throughput"], batching=report["batching"])
+        return
+    profile = start = end = None
+    rate = args.rate
+    if args.profile:
+        profile = PROFILES[args.profile]
+        start, end = parse_hour(args.from_hour) * 3600, parse_hour(args.to_hour) * 3600
+        peak, mean = profile.peak_and_mean(args.users * len(sns), start, end, ATTENDANCE)
+        rate = mean * args.speedup
+        print(f"🚀 {len(sns)} terminales × {args.users} usuarios, perfil {args.profile} "
+              f"{args.from_hour}–{args.to_hour} a x{args.speedup:g} "
+              f"({(end - start) / args.speedup:.0f} s reales): "
+              f"media {rate:.1f} registros/s, pico {peak * args.speedup:.1f} registros/s "
+              f"(x{peak / mean if mean else 0:.1f})")
+    else:
+        print(f"🚀 {len(sns)} terminales, sendlog a {rate:g} registros/s "
+              f"durante {args.duration:g} s contra {args.url}")
+    report = asyncio.run(run_load(sns, url=args.url, rate=rate, batch=args.batch,
+                                  batch_max=args.batch_max, duration=args.duration,
+                                  seed=args.seed, profile=profile, users=args.users,
+                                  start=start, end=end, speedup=args.speedup))
+    logger.flush()
+    print_report(report)
+    if args.latency_out:
+        write_latency_report(args.latency_out, report["latency"],
+                             target_rate=report["target_rate"],
+                             achieved_rate=report["achieved_rate"],
+                             error_rate=report["error_rate"])
+
+
+# ------------------- EJECUCIÓN -------------------
+if __name__ == "__main__":
+    try:
+        run(parse_args())
+    except KeyboardInterrupt:
+        print("\n🛑 Carga detenida.")
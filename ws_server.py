@@ -0,0 +1,293 @@
+import asyncio
+import argparse
+import json
+from collections import Counter, deque
+from datetime import datetime
+
+import websockets
+
+import codec
+from config import TIMEOUT_SECONDS, LOCAL_HOST, LOCAL_PORT
+from clock import loop_time
+from metrics import observe, report_periodically, write_latency_report
+from simlog import INFO, WARNING, configure, logger
+
+# -------------------------------------------------
+# Servidor local que imita el lado servidor del protocolo:
+# responde reg, confirma sendlog/senduser, recorre getalllog /
+# getnewlog / getuserlist con stn y permite lanzar cualquier otro
+# comando a los terminales conectados (por script o desde código).
+# -------------------------------------------------
+
+def cloudtime(clock=None) -> str:
+    """Hora del servidor: la real, o la de un reloj virtual (ws_sim.py)."""
+    if clock is not None:
+        return clock.format()
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class DeviceConn:
+    """Estado del servidor para un terminal conectado."""
+
+    __slots__ = ("sn", "ws", "pending", "sweeps")
+
+    def __init__(self, sn, ws):
+        self.sn = sn
+        self.ws = ws
+        self.pending = {}   # cmd → deque de (futuro, instante de envío)
+        self.sweeps = {}    # cmd → {"records": [...], "future": futuro, "sent_at": instante}
+
+
+class ServerStandIn:
+    """Lógica del servidor independiente del transporte (`ws` con send/recv)."""
+
+    def __init__(self, script=None, verbose: bool = False, clock=None):
+        self.devices = {}
+        self.script = script or []
+        self.verbose = verbose
+        self.clock = clock
+        self.stats = Counter()
+        self.latency = {}
+        self.registered = asyncio.Event()
+        self.script_tasks = []
+
+    def log(self, *args, level: int = INFO, sn: str = None, **fields):
+        if (self.verbose or level >= WARNING) and logger.enabled(level):
+            logger.emit(level, " ".join(map(str, args)), sn=sn, **fields)
+
+    def observe(self, name: str, seconds: float):
+        observe(self.latency, name, seconds)
+
+    async def send(self, ws, payload: dict):
+        await ws.send(codec.dumps(payload))
+        self.stats["frames_out"] += 1
+
+    # ------------------- CONEXIONES -------------------
+
+    async def handle_connection(self, ws):
+        conn = None
+        try:
+            async for message in ws:
+                self.stats["frames_in"] += 1
+                try:
+                    data = codec.loads(message)
+                except codec.DECODE_ERRORS:
+                    data = None
+                if not isinstance(data, dict):
+                    self.log("⚠️ Mensaje inválido (no JSON):", message[:200], level=WARNING,
+                             sn=conn.sn if conn else None)
+                    self.stats["bad_frames"] += 1
+                    continue
+
+                if data.get("cmd") == "reg":
+                    conn = await self.on_register(ws, data)
+                elif conn is None:
+                    self.stats["unregistered_frames"] += 1
+                elif "cmd" in data:
+                    await self.on_device_command(conn, data)
+                else:
+                    await self.on_device_reply(conn, data)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            if conn is not None and self.devices.get(conn.sn) is conn:
+                del self.devices[conn.sn]
+                self.stats["disconnected"] += 1
+                for queue in conn.pending.values():
+                    for future, _ in queue:
+                        if not future.done():
+                            future.set_exception(ConnectionError(f"{conn.sn} desconectado"))
+                for sweep in conn.sweeps.values():
+                    if not sweep["future"].done():
+                        sweep["future"].set_exception(ConnectionError(f"{conn.sn} desconectado"))
+                conn.sweeps.clear()
+
+    async def on_register(self, ws, data):
+        sn = data.get("sn")
+        if not sn or "devinfo" not in data:
+            self.stats["reg_rejected"] += 1
+            await self.send(ws, {"ret": "reg", "result": False, "reason": 1})
+            return None
+
+        conn = DeviceConn(sn, ws)
+        self.devices[sn] = conn
+        self.stats["registered"] += 1
+        self.registered.set()
+        await self.send(ws, {"ret": "reg", "result": True, "cloudtime": cloudtime(self.clock)})
+        self.log("✅ Registrado", sn=sn, connected=len(self.devices))
+        if self.script:
+            self.script_tasks.append(asyncio.create_task(self.run_script(sn, self.script)))
+        return conn
+
+    async def on_device_command(self, conn, data):
+        """Mensajes que el terminal inicia: sendlog y senduser."""
+        cmd = data["cmd"]
+        if cmd == "sendlog":
+            records = data.get("record")
+            if not isinstance(records, list):
+                self.stats["sendlog_rejected"] += 1
+                await self.send(conn.ws, {"ret": "sendlog", "result": False, "reason": 1})
+                return
+            self.stats["sendlog_records"] += len(records)
+            await self.send(conn.ws, {"ret": "sendlog", "result": True, "count": len(records),
+                                      "logindex": 0, "cloudtime": cloudtime(self.clock)})
+        elif cmd == "senduser":
+            ok = data.get("enrollid") is not None
+            self.stats["senduser_ok" if ok else "senduser_rejected"] += 1
+            response = {"ret": "senduser", "result": ok, "cloudtime": cloudtime(self.clock)}
+            if not ok:
+                response["reason"] = 1
+            await self.send(conn.ws, response)
+        else:
+            self.stats["unknown_device_cmd"] += 1
+
+    async def on_device_reply(self, conn, data):
+        """Respuestas 'ret' del terminal a comandos del servidor."""
+        cmd = data.get("ret")
+        sweep = conn.sweeps.get(cmd)
+        if sweep is not None:
+            # Cada paquete es un ida y vuelta servidor → terminal
+            self.observe(f"down:{cmd}", loop_time() - sweep["sent_at"])
+            records = data.get("record") or []
+            if data.get("result") and data.get("count", 0) > 0:
+                sweep["records"].extend(records)
+                sweep["packets"] += 1
+                sweep["sent_at"] = loop_time()
+                await self.send(conn.ws, {"cmd": cmd, "stn": False})
+                return
+            del conn.sweeps[cmd]
+            if data.get("result"):
+                # result:true con count 0: no quedan más paquetes
+                sweep["future"].set_result(sweep["records"])
+            else:
+                # Un result:false a mitad del recorrido deja la descarga incompleta:
+                # no se da por buena con los paquetes que llegaron hasta ahí
+                self.stats[f"sweep_{cmd}_failed"] += 1
+                sweep["future"].set_exception(RuntimeError(
+                    f"{conn.sn}: {cmd} result false tras {sweep['packets']} paquetes"))
+            return
+
+        queue = conn.pending.get(cmd)
+        if not queue:
+            self.stats["unexpected_ret"] += 1
+            return
+        future, sent_at = queue.popleft()
+        self.observe(f"down:{cmd}", loop_time() - sent_at)
+        if not future.done():
+            future.set_result(data)
+
+    # ------------------- EMISOR DE COMANDOS -------------------
+
+    async def command(self, sn: str, payload: dict, timeout: float = TIMEOUT_SECONDS) -> dict:
+        """Envía un comando a un terminal y espera su 'ret'."""
+        conn = self.devices[sn]
+        future = asyncio.get_running_loop().create_future()
+        conn.pending.setdefault(payload["cmd"], deque()).append((future, loop_time()))
+        await self.send(conn.ws, payload)
+        self.stats[f"sent_{payload['cmd']}"] += 1
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.stats[f"timeout_{payload['cmd']}"] += 1
+            raise
+
+    async def sweep(self, sn: str, cmd: str = "getalllog",
+                    timeout: float = TIMEOUT_SECONDS) -> list:
+        """
+        Descarga todos los paquetes de getalllog / getnewlog / getuserlist.
+        `timeout` es por paquete: cada respuesta reinicia la espera.
+        """
+        conn = self.devices[sn]
+        future = asyncio.get_running_loop().create_future()
+        started = loop_time()
+        sweep = {"records": [], "packets": 0, "future": future, "sent_at": started}
+        conn.sweeps[cmd] = sweep
+        await self.send(conn.ws, {"cmd": cmd, "stn": True})
+        while not future.done():
+            remaining = sweep["sent_at"] + timeout - loop_time()
+            if remaining <= 0:
+                if conn.sweeps.get(cmd) is sweep:
+                    del conn.sweeps[cmd]
+                future.cancel()
+                self.stats[f"timeout_{cmd}"] += 1
+                raise asyncio.TimeoutError(f"{sn}: {cmd} sin respuesta tras {sweep['packets']} paquetes")
+            await asyncio.wait([future], timeout=remaining)
+        records = future.result()
+        self.observe(f"sweep:{cmd}", loop_time() - started)
+        self.stats[f"sweep_{cmd}_records"] += len(records)
+        return records
+
+    async def run_script(self, sn: str, steps: list):
+        """
+        Ejecuta una lista de pasos sobre un terminal, por ejemplo:
+          [{"cmd": "opendoor"}, {"sweep": "getalllog"}, {"sleep": 1}]
+        """
+        for step in steps:
+            try:
+                if "sleep" in step:
+                    await asyncio.sleep(step["sleep"])
+                elif "sweep" in step:
+                    records = await self.sweep(sn, step["sweep"])
+                    self.log("📥 Recorrido terminado", sn=sn, cmd=step["sweep"], records=len(records))
+                else:
+                    response = await self.command(sn, dict(step))
+                    self.log("📩", response, sn=sn)
+            except (asyncio.TimeoutError, ConnectionError, KeyError, RuntimeError) as ex:
+                self.log(f"⚠️ Paso {step} falló ({ex!r})", level=WARNING, sn=sn)
+                self.stats["script_errors"] += 1
+                if sn not in self.devices:
+                    return
+
+    def print_report(self):
+        logger.flush()
+        print("\n📊 Reporte del servidor local")
+        for key, value in sorted(self.stats.items()):
+            print(f"   ➤ {key}: {value}")
+        for name, hist in sorted(self.latency.items()):
+            print(f"   ➤ Latencia {name}: {hist.summary()}")
+
+
+# ------------------- EJECUCIÓN -------------------
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Servidor local del protocolo de terminales")
+    parser.add_argument("--host", default=LOCAL_HOST)
+    parser.add_argument("--port", type=int, default=LOCAL_PORT)
+    parser.add_argument("--script", help="JSON con la lista de pasos a ejecutar en cada terminal")
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--log-level", help="debug / info / warning / error")
+    parser.add_argument("--log-file", help="fichero de log (por defecto stdout)")
+    parser.add_argument("--report-every", type=float, default=0,
+                        help="segundos entre volcados de percentiles al log (0 = solo al final)")
+    parser.add_argument("--latency-out", help="JSON con percentiles e histogramas al terminar")
+    return parser.parse_args()
+
+
+async def run(args):
+    configure(level=args.log_level, path=args.log_file)
+    script = None
+    if args.script:
+        with open(args.script) as f:
+            script = json.load(f)
+    standin = ServerStandIn(script=script, verbose=args.verbose)
+    print(f"🛰️ Servidor local escuchando en ws://{args.host}:{args.port}/ws")
+    reporter = None
+    if args.report_every:
+        reporter = asyncio.create_task(report_periodically(standin.latency, args.report_every,
+                                                           "servidor"))
+    try:
+        async with websockets.serve(standin.handle_connection, args.host, args.port):
+            await asyncio.Future()
+    finally:
+        if reporter is not None:
+            reporter.cancel()
+        standin.print_report()
+        if args.latency_out:
+            write_latency_report(args.latency_out, standin.latency, stats=dict(standin.stats))
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(run(parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,378 @@
+import asyncio
+import argparse
+import hashlib
+import random
+import selectors
+import time
+from collections import Counter
+
+import websockets
+from websockets.frames import Close
+
+from batching import print_summary, summarize
+from clock import VirtualClock
+from config import (FLEET_SN_PREFIX, FLEET_SN_START, STORE_USERSIZE, STORE_LOGSIZE,
+                    FLUSH_BATCH_SIZE, FLUSH_RATE, SENDLOG_ADAPTIVE)
+from device import DeviceSession
+from metrics import LatencyHistogram
+from store import DeviceStore
+from workload import DAY, PROFILES, parse_hour
+from ws_fleet import sn_range
+from ws_server import ServerStandIn
+
+# ------------------- CONFIGURACIÓN -------------------
+DEVICES = 1000
+USERS = 20                  # Usuarios (y fichajes del perfil) por terminal
+PROFILE = "office_lunch"
+SIM_DAY = "2025-10-16"      # Día simulado
+NET_LATENCY = 0.002         # Latencia de red de ida (segundos virtuales)
+NET_JITTER = 0.001
+SWEEP_AFTER = 600           # El servidor barre getalllog 10 min después del fin del día
+OUTAGE = None               # Corte del servidor, p. ej. "08:45-09:30" (None = sin corte)
+
+# -------------------------------------------------
+# Simulación de eventos discretos: terminales (DeviceSession, mismos
+# handlers que en red) contra ServerStandIn dentro del mismo proceso,
+# con un transporte en memoria y un loop de asyncio cuyo reloj salta de
+# un evento al siguiente en lugar de dormir. Un día entero de fichajes
+# más los barridos getalllog de toda la flota tarda segundos, y con la
+# misma semilla el orden de los mensajes es idéntico (ver "huella").
+# -------------------------------------------------
+
+# ------------------- LOOP DE TIEMPO VIRTUAL -------------------
+
+class _VirtualSelector(selectors.SelectSelector):
+    """Sin E/S real: esperar `timeout` segundos es adelantar el reloj del loop."""
+
+    def __init__(self, loop):
+        super().__init__()
+        self.loop = loop
+
+    def select(self, timeout=None):
+        if timeout is None:
+            raise RuntimeError("Simulación bloqueada: ninguna tarea tiene eventos pendientes")
+        if timeout > 0:
+            self.loop.advance(timeout)
+        return []
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    """Loop de asyncio con reloj virtual: asyncio.sleep y los timeouts no esperan."""
+
+    def __init__(self):
+        self._virtual_now = 0.0
+        super().__init__(_VirtualSelector(self))
+        self._clock_resolution = 1e-6
+
+    def time(self) -> float:
+        return self._virtual_now
+
+    def advance(self, seconds: float):
+        self._virtual_now += seconds
+
+
+def run_virtual(coro):
+    """asyncio.run con el loop de tiempo virtual."""
+    with asyncio.Runner(loop_factory=VirtualTimeLoop) as runner:
+        return runner.run(coro)
+
+
+# ------------------- TRANSPORTE EN MEMORIA -------------------
+
+_CLOSE = object()
+
+
+def _closed_error() -> websockets.ConnectionClosed:
+    close = Close(1000, "")
+    return websockets.ConnectionClosedOK(close, close, True)
+
+
+class MemorySocket:
+    """Extremo de una conexión en memoria con la parte de la API de websockets que se usa."""
+
+    __slots__ = ("network", "name", "peer", "inbox", "closed", "last_delivery")
+
+    def __init__(self, network, name: str):
+        self.network = network
+        self.name = name
+        self.peer = None
+        self.inbox = asyncio.Queue()
+        self.closed = False
+        self.last_delivery = 0.0
+
+    async def send(self, message):
+        if self.closed:
+            raise _closed_error()
+        self.network.deliver(self, message)
+
+    async def recv(self):
+        if self.closed:
+            raise _closed_error()
+        message = await self.inbox.get()
+        if message is _CLOSE:
+            self.closed = True
+            raise _closed_error()
+        return message
+
+    async def close(self):
+        if not self.closed:
+            self.closed = True
+            self.network.deliver(self, _CLOSE)
+            self.inbox.put_nowait(_CLOSE)   # despierta un recv local pendiente
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self.recv()
+        except websockets.ConnectionClosed:
+            raise StopAsyncIteration
+
+
+class _MemoryConnect:
+    """Equivalente de `websockets.connect(url)` como context manager asíncrono."""
+
+    def __init__(self, network, url: str):
+        self.network = network
+        self.url = url
+        self.ws = None
+
+    async def __aenter__(self):
+        self.ws = await self.network.open()
+        return self.ws
+
+    async def __aexit__(self, *exc):
+        await self.ws.close()
+
+
+class MemoryNetwork:
+    """
+    Red en memoria hacia un ServerStandIn: cada mensaje llega tras la latencia
+    de ida (con jitter sembrado) y en orden dentro de cada conexión, como en TCP.
+    """
+
+    def __init__(self, server: ServerStandIn, latency: float = NET_LATENCY,
+                 jitter: float = NET_JITTER, seed=None):
+        self.server = server
+        self.latency = latency
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.connections = 0
+        self.frames = 0
+        self.trace = hashlib.sha256()
+        self.server_tasks = []
+        self.server_sockets = []
+        self.down = False   # servidor caído: se rechazan las conexiones nuevas
+
+    def connect(self, url: str, **options) -> _MemoryConnect:
+        """`options` (ping_interval...) son de websockets.connect: sin efecto en memoria."""
+        return _MemoryConnect(self, url)
+
+    async def open(self) -> MemorySocket:
+        if self.down:
+            await asyncio.sleep(2 * self.latency)
+            raise ConnectionRefusedError(111, "Servidor caído (simulación)")
+        self.connections += 1
+        client = MemorySocket(self, f"c{self.connections}>")
+        server = MemorySocket(self, f"c{self.connections}<")
+        client.peer, server.peer = server, client
+        self.server_sockets.append(server)
+        await asyncio.sleep(2 * self.latency)   # handshake
+        self.server_tasks.append(asyncio.create_task(self.server.handle_connection(server)))
+        return client
+
+    async def outage(self, start: float, end: float):
+        """Cae el servidor entre `start` y `end` (tiempo del loop): corta y rechaza conexiones."""
+        await asyncio.sleep(start - asyncio.get_running_loop().time())
+        self.down = True
+        sockets, self.server_sockets = self.server_sockets, []
+        for ws in sockets:
+            await ws.close()
+        await asyncio.sleep(end - start)
+        self.down = False
+
+    def deliver(self, sender: MemorySocket, message):
+        loop = asyncio.get_running_loop()
+        at = max(loop.time() + self.latency + self.rng.random() * self.jitter,
+                 sender.last_delivery)
+        sender.last_delivery = at
+        loop.call_at(at, sender.peer.inbox.put_nowait, message)
+        if message is not _CLOSE:
+            self.frames += 1
+            self.trace.update(f"{at:.6f} {sender.name} {message}\n".encode())
+
+
+# ------------------- ESCENARIO -------------------
+
+async def punch_day(punches: list, clock: VirtualClock, stats: Counter):
+    """
+    Empuja por sendlog cada fichaje (t, sesión, enrollid, inout) a su hora simulada
+    (sin conexión queda en el buffer del terminal). Un solo recorrido ordenado para
+    toda la flota: un temporizador pendiente en lugar de uno por terminal mantiene
+    pequeño el heap del loop.
+    """
+    start = clock.origin
+    for t, session, enrollid, inout in punches:
+        delay = start + t - clock.now()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if not session.online:
+            stats["punches_offline"] += 1
+        await session.send_logs([session.punch_one(enrollid, int(clock.now()), inout)])
+
+
+async def watch_backlog(sessions: list, end: float, stats: Counter) -> float:
+    """
+    Segundos desde el fin del corte (`end`, tiempo del loop) hasta que toda la
+    flota ha subido su atraso y recibido los ret (los lotes rechazados cuentan
+    cuando se suben de nuevo o se dan por perdidos).
+    """
+    loop = asyncio.get_running_loop()
+    await asyncio.sleep(end - loop.time())
+    stats["backlog_at_recovery"] = sum(s.store.unsent_count() for s in sessions)
+    while any(s.store.unsent_count() or s.rejected or s.pending.get("sendlog")
+              for s in sessions):
+        await asyncio.sleep(1)
+    return loop.time() - end
+
+
+async def run_scenario(devices: int = DEVICES, users: int = USERS, profile: str = PROFILE,
+                       seed=0, latency: float = NET_LATENCY, jitter: float = NET_JITTER,
+                       day: str = SIM_DAY, outage: tuple = None,
+                       flush_batch: int = FLUSH_BATCH_SIZE,
+                       flush_rate: float = FLUSH_RATE,
+                       adaptive: bool = SENDLOG_ADAPTIVE) -> dict:
+    """`outage` = (desde, hasta) en segundos desde las 00:00 del día simulado."""
+    loop = asyncio.get_running_loop()
+    clock = VirtualClock(1.0, f"{day} 00:00:00", source=loop.time)
+    server = ServerStandIn(clock=clock)
+    network = MemoryNetwork(server, latency, jitter, seed)
+    stats = Counter()
+    latency_hists = {}
+
+    sessions = []
+    for sn in sn_range(FLEET_SN_PREFIX, FLEET_SN_START, devices):
+        store = DeviceStore(STORE_USERSIZE, STORE_LOGSIZE)
+        store.seed_users(users)
+        sessions.append(DeviceSession(sn, url=f"mem://{sn}", stats=stats, latency=latency_hists,
+                                      seed=f"{seed}:{sn}", store=store, clock=clock,
+                                      connect=network.connect, flush_batch=flush_batch,
+                                      flush_rate=flush_rate, adaptive=adaptive,
+                                      # La red en memoria no pierde conexiones mudas:
+                                      # sin pings (millones de eventos en una jornada)
+                                      keepalive="off", verbose=False))
+    tasks = [asyncio.create_task(s.run()) for s in sessions]
+    watcher = None
+    if outage is not None:
+        # El día empieza en el instante 0 del loop: las horas son tiempos del loop
+        asyncio.create_task(network.outage(*outage))
+        watcher = asyncio.create_task(watch_backlog(sessions, outage[1], stats))
+
+    shift = PROFILES[profile]
+    punches = []
+    for i, s in enumerate(sessions):
+        rng = random.Random(f"{seed}:{s.sn}:day")
+        punches.extend((t, i, enrollid, inout) for t, enrollid, inout in shift.sample(users, 0, DAY, rng))
+    punches.sort()
+    await punch_day([(t, sessions[i], e, io) for t, i, e, io in punches], clock, stats)
+
+    absorb = await watcher if watcher is not None else None
+
+    # Al final del día el servidor descarga todos los logs de cada terminal
+    await asyncio.sleep(DAY + SWEEP_AFTER - loop.time())
+    sweeps = await asyncio.gather(*(server.sweep(sn, "getalllog") for sn in list(server.devices)),
+                                  return_exceptions=True)
+    stats["sweep_errors"] = sum(isinstance(r, Exception) for r in sweeps)
+    expected = sum(s.store.log_count() for s in sessions)
+
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await asyncio.gather(*network.server_tasks, return_exceptions=True)
+
+    report = dict(stats)
+    report.update({
+        "devices": devices,
+        "virtual_seconds": loop.time(),
+        "frames": network.frames,
+        "trace": network.trace.hexdigest()[:16],
+        "logs_expected": expected,
+        "outage": outage,
+        "absorb_seconds": absorb,
+        "batching": summarize([s.batcher for s in sessions]) if adaptive else None,
+        "server": dict(server.stats),
+        "latency": {**latency_hists, **server.latency},
+    })
+    return report
+
+
+def print_report(report: dict, wall: float):
+    server = report["server"]
+    print("\n📊 Simulación de eventos discretos")
+    registered = report.get("registered", 0) - report.get("reconnected", 0)
+    print(f"   ➤ Dispositivos registrados: {registered} / {report['devices']}")
+    print(f"   ➤ Tiempo simulado / real:   {report['virtual_seconds'] / 3600:.1f} h / {wall:.1f} s")
+    print(f"   ➤ Mensajes:                 {report['frames']}")
+    print(f"   ➤ sendlog ok / fallidos:    {report.get('sendlog_ok', 0)} / "
+          f"{report.get('sendlog_failed', 0)}")
+    print(f"   ➤ getalllog barridos:       {server.get('sweep_getalllog_records', 0)} registros "
+          f"(esperados {report['logs_expected']})")
+    if report["outage"] is not None:
+        start, end = report["outage"]
+        print(f"   ➤ Corte del servidor:       {start / 3600:.2f} h → {end / 3600:.2f} h "
+              f"({(end - start) / 60:.0f} min)")
+        print(f"   ➤ Fichajes sin conexión:    {report.get('punches_offline', 0)} "
+              f"(atraso al volver {report.get('backlog_at_recovery', 0)}, "
+              f"perdidos {report.get('logs_overwritten', 0)} pisados + "
+              f"{report.get('sendlog_lost_records', 0)} rechazados)")
+        print(f"   ➤ Reconexiones / intentos:  {report.get('reconnected', 0)} / "
+              f"{report.get('reconnect_attempts', 0)}")
+        print(f"   ➤ Atraso absorbido en:      {report['absorb_seconds']:.1f} s "
+              f"({report.get('flush_records', 0)} registros en lotes, "
+              f"{report.get('flush_retried_records', 0)} reenviados tras result:false)")
+    if report["batching"] is not None:
+        print_summary(report["batching"])
+    print(f"   ➤ Huella del orden:         {report['trace']}")
+    for name, hist in sorted(report["latency"].items()):
+        if isinstance(hist, LatencyHistogram):
+            print(f"   ➤ Latencia {name}: {hist.summary()}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Simulación determinista en tiempo virtual")
+    parser.add_argument("--devices", type=int, default=DEVICES)
+    parser.add_argument("--users", type=int, default=USERS)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default=PROFILE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=NET_LATENCY)
+    parser.add_argument("--jitter", type=float, default=NET_JITTER)
+    parser.add_argument("--day", default=SIM_DAY)
+    parser.add_argument("--outage", default=OUTAGE,
+                        help="corte del servidor HH:MM-HH:MM (los terminales siguen fichando)")
+    parser.add_argument("--flush-batch", type=int, default=FLUSH_BATCH_SIZE,
+                        help="registros por sendlog al subir el atraso")
+    parser.add_argument("--adaptive", action="store_true", default=SENDLOG_ADAPTIVE,
+                        help="lote AIMD de batching.py al subir el atraso")
+    parser.add_argument("--flush-rate", type=float, default=FLUSH_RATE,
+                        help="tope de registros/s por terminal al subir el atraso (0 = sin tope)")
+    return parser.parse_args()
+
+
+def run(args):
+    print(f"🧪 {args.devices} terminales × {args.users} usuarios, perfil {args.profile}, "
+          f"semilla {args.seed}")
+    started = time.perf_counter()
+    outage = None
+    if args.outage:
+        start, end = args.outage.split("-")
+        outage = (parse_hour(start) * 3600, parse_hour(end) * 3600)
+    report = run_virtual(run_scenario(args.devices, args.users, args.profile, args.seed,
+                                      args.latency, args.jitter, args.day, outage,
+                                      args.flush_batch, args.flush_rate, args.adaptive))
+    print_report(report, time.perf_counter() - started)
+
+
+# ------------------- EJECUCIÓN -------------------
+if __name__ == "__main__":
+    run(parse_args())